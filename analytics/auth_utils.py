@@ -0,0 +1,72 @@
+from fastapi import HTTPException, status, Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import JWTError, jwt
+import httpx
+from config import settings
+from http_client import http_client
+from token_cache import TokenCache
+
+security = HTTPBearer()
+token_cache = TokenCache(settings.AUTH_CACHE_MAX_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+
+
+def verify_token_locally(token: str) -> dict:
+    """Check token signature and expiry without calling the auth service"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token"
+        )
+
+    if payload.get("type") != "access" or not payload.get("sub"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token"
+        )
+
+    return {
+        "id": payload["sub"],
+        "email": payload.get("email"),
+        "name": payload.get("name"),
+        "role": payload.get("role")
+    }
+
+
+async def validate_token_remotely(token: str) -> dict:
+    """Verify token with auth service and get user info"""
+    try:
+        response = await http_client.client.get(
+            f"{settings.AUTH_SERVICE_URL}/auth/validate",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+    except httpx.RequestError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Auth service unavailable"
+        )
+
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token"
+        )
+
+    return response.json()
+
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Resolve the caller from the bearer token according to AUTH_MODE"""
+    token = credentials.credentials
+
+    if settings.AUTH_MODE == "local":
+        user = verify_token_locally(token)
+        # Deleted users are only known to the auth service
+        if not settings.AUTH_REVOCATION_CHECK:
+            return user
+
+    if settings.AUTH_CACHE_ENABLED:
+        return await token_cache.get_or_load(token, validate_token_remotely)
+
+    return await validate_token_remotely(token)
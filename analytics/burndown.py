@@ -0,0 +1,336 @@
+import asyncio
+import io
+import math
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from database import engine
+
+# Stands in for NULL so that every COPY row has the same width
+NO_DAY = np.iinfo(np.int32).max
+EPOCH_DATE = date(1970, 1, 1)
+
+# COPY binary: 11-byte signature, int32 flags, int32 header extension length (0)
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+COPY_HEADER_SIZE = 19
+COPY_TRAILER_SIZE = 2
+# Per row: int16 field count, then an int32 length and the value of each field
+COPY_ROW = np.dtype([
+    ("fields", ">i2"),
+    ("id_length", ">i4"), ("id", "S16"),
+    ("created_length", ">i4"), ("created", ">i4"),
+    ("due_length", ">i4"), ("due", ">i4"),
+    ("completed_length", ">i4"), ("completed", ">i4")
+])
+COPY_QUERY = f"""COPY (
+    SELECT "taskId",
+           "createdAt"::date - DATE '1970-01-01',
+           coalesce("dueDate"::date - DATE '1970-01-01', {NO_DAY}),
+           coalesce("completedAt"::date - DATE '1970-01-01', {NO_DAY})
+    FROM task_facts
+    WHERE "projectId" = %s AND NOT deleted {{task_filter}}
+) TO STDOUT (FORMAT binary)"""
+
+
+class TaskColumns:
+    """Ids and created, due and completed dates (day numbers since the epoch) of a project's tasks.
+
+    Rows are ordered by id, which lets changed tasks be found by binary search.
+    """
+
+    __slots__ = ("ids", "created", "due", "completed")
+
+    def __init__(self, ids: np.ndarray, created: np.ndarray, due: np.ndarray, completed: np.ndarray):
+        self.ids = ids
+        self.created = created
+        self.due = due
+        self.completed = completed
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def take(self, index) -> "TaskColumns":
+        return TaskColumns(self.ids[index], self.created[index], self.due[index], self.completed[index])
+
+
+def load_columns(project_id: str, task_ids: Optional[list] = None) -> TaskColumns:
+    """Read the columns with one binary COPY, parsed by NumPy without per-row Python objects"""
+    query = COPY_QUERY.format(task_filter='AND "taskId" = ANY(%s::uuid[])' if task_ids is not None else "")
+    params = (project_id,) if task_ids is None else (project_id, [str(task_id) for task_id in task_ids])
+    buffer = io.BytesIO()
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(cursor.mogrify(query, params).decode(), buffer)
+    finally:
+        connection.close()
+
+    data = buffer.getbuffer()
+    if bytes(data[:len(COPY_SIGNATURE)]) != COPY_SIGNATURE:
+        raise ValueError("Unexpected COPY binary header")
+    rows = np.frombuffer(
+        data, COPY_ROW,
+        count=(len(data) - COPY_HEADER_SIZE - COPY_TRAILER_SIZE) // COPY_ROW.itemsize,
+        offset=COPY_HEADER_SIZE
+    )
+    ids = rows["id"].copy()
+    order = _id_order(ids)
+    return TaskColumns(
+        ids[order],
+        rows["created"][order].astype(np.int64),
+        rows["due"][order].astype(np.int64),
+        rows["completed"][order].astype(np.int64)
+    )
+
+
+def _id_order(ids: np.ndarray) -> np.ndarray:
+    """Argsort of 16-byte ids, several times faster than sorting them as strings"""
+    words = ids.view(">u8").reshape(-1, 2).astype(np.uint64)
+    order = np.argsort(words[:, 0])
+    # Random uuids practically never share the first 8 bytes
+    if np.any(np.diff(words[order, 0]) == 0):
+        order = np.lexsort((words[:, 1], words[:, 0]))
+    return order
+
+
+def patch_columns(columns: TaskColumns, task_ids: list, changed: TaskColumns) -> TaskColumns:
+    """New columns with the rows of task_ids replaced by their current state in changed.
+
+    Tasks missing from changed were deleted. The original arrays are left
+    untouched for computations still reading them.
+    """
+    ids = np.array([task_id.bytes for task_id in task_ids], dtype="S16")
+
+    positions = np.searchsorted(columns.ids, ids)
+    found = positions < len(columns)
+    found[found] = columns.ids[positions[found]] == ids[found]
+    keep = np.ones(len(columns), dtype=bool)
+    keep[positions[found]] = False
+    columns = columns.take(keep)
+
+    at = np.searchsorted(columns.ids, changed.ids)
+    return TaskColumns(
+        np.insert(columns.ids, at, changed.ids),
+        np.insert(columns.created, at, changed.created),
+        np.insert(columns.due, at, changed.due),
+        np.insert(columns.completed, at, changed.completed)
+    )
+
+
+def today() -> int:
+    return int(time.time() // 86400)
+
+
+def to_date(day: int) -> date:
+    return EPOCH_DATE + timedelta(days=int(day))
+
+
+def to_day(value: date) -> int:
+    return (value - EPOCH_DATE).days
+
+
+def _per_day(days: np.ndarray, length: int) -> np.ndarray:
+    in_range = (days >= 0) & (days < length)
+    return np.bincount(days[in_range], minlength=length)
+
+
+def _moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over window entries; the first ones average what is available"""
+    totals = np.cumsum(values)
+    shifted = np.concatenate((np.zeros(window, dtype=totals.dtype), totals))[:len(values)]
+    return (totals - shifted) / np.minimum(np.arange(1, len(values) + 1), window)
+
+
+def forecast_completion(columns: TaskColumns, current_day: int) -> Optional[date]:
+    """Date the open tasks run out at the throughput of the last velocity window"""
+    open_tasks = int(np.count_nonzero(columns.completed == NO_DAY))
+    if not open_tasks:
+        return to_date(current_day)
+    window_days = settings.ANALYTICS_SPRINT_DAYS * settings.ANALYTICS_VELOCITY_WINDOW
+    recent = np.count_nonzero((columns.completed > current_day - window_days) & (columns.completed <= current_day))
+    if not recent:
+        return None
+    return to_date(current_day + math.ceil(open_tasks * window_days / recent))
+
+
+def compute_burndown(columns: TaskColumns, first_day: Optional[int], last_day: Optional[int], current_day: int) -> dict:
+    """Daily opened, closed, remaining, planned and overdue series between first_day and last_day.
+
+    The series never starts before the project's first task and covers at
+    most the last ANALYTICS_BURNDOWN_MAX_DAYS days of the range.
+    """
+    first_created = int(columns.created.min()) if len(columns.created) else current_day
+    first_day = first_created if first_day is None else max(first_day, first_created)
+    if last_day is None:
+        last_day = current_day
+    first_day = max(first_day, last_day - settings.ANALYTICS_BURNDOWN_MAX_DAYS + 1)
+    length = max(0, last_day - first_day + 1)
+
+    created = columns.created - first_day
+    completed = columns.completed - first_day
+    # A task is planned to be done by its due date, but never before it exists
+    due = np.maximum(columns.due, columns.created) - first_day
+
+    opened = _per_day(created, length)
+    closed = _per_day(completed, length)
+    opened_total = np.count_nonzero(created < 0) + np.cumsum(opened)
+    remaining = opened_total - (np.count_nonzero(completed < 0) + np.cumsum(closed))
+    planned = opened_total - (np.count_nonzero(due < 0) + np.cumsum(_per_day(due, length)))
+
+    # Overdue from the day after the due date until the day it is completed
+    starts = np.clip(due + 1, 0, length)
+    stops = np.clip(completed, 0, length)
+    spans = starts < stops
+    overdue = np.cumsum(
+        np.bincount(starts[spans], minlength=length + 1) - np.bincount(stops[spans], minlength=length + 1)
+    )[:length]
+
+    return {
+        "dates": np.arange(first_day, first_day + length).astype("datetime64[D]").tolist(),
+        "opened": opened.tolist(),
+        "closed": closed.tolist(),
+        "remaining": remaining.tolist(),
+        "plannedRemaining": planned.tolist(),
+        "overdue": overdue.tolist(),
+        "closedMovingAverage": _moving_average(closed, settings.ANALYTICS_MOVING_AVERAGE_DAYS).tolist(),
+        "forecastCompletionDate": forecast_completion(columns, current_day)
+    }
+
+
+def compute_velocity(columns: TaskColumns, sprints: int, current_day: int) -> dict:
+    """Completed tasks per sprint, the last sprint ending today, with a moving average"""
+    sprint_days = settings.ANALYTICS_SPRINT_DAYS
+    done = columns.completed[columns.completed != NO_DAY]
+    sprints_ago = (current_day - done) // sprint_days
+    sprints_ago = sprints_ago[(sprints_ago >= 0) & (sprints_ago < sprints)]
+    completed = np.bincount(sprints_ago, minlength=sprints)[::-1]
+    moving_average = _moving_average(completed, settings.ANALYTICS_VELOCITY_WINDOW)
+
+    return {
+        "sprintDays": sprint_days,
+        "sprints": [
+            {
+                "start": to_date(current_day - (sprints - index) * sprint_days + 1),
+                "end": to_date(current_day - (sprints - 1 - index) * sprint_days),
+                "completed": int(completed[index]),
+                "movingAverage": float(moving_average[index])
+            }
+            for index in range(sprints)
+        ],
+        "openTasks": int(np.count_nonzero(columns.completed == NO_DAY)),
+        "forecastCompletionDate": forecast_completion(columns, current_day)
+    }
+
+
+class ProjectResultCache:
+    """LRU of loaded TaskColumns per project together with the results computed from them.
+
+    A flush that writes task_facts of a cached project drops its results
+    and queues the written task ids; the next request re-reads just those
+    rows and patches them into the columns instead of reloading the project.
+    Concurrent requests for one project share a single load or patch.
+    Each project keeps its ANALYTICS_BURNDOWN_RESULTS_PER_PROJECT most
+    recently used results.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.patches = 0
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Changes reported while the first load of a project was in flight
+        self._early: Dict[str, set] = {}
+
+    async def get(self, project_id: str, key: tuple, compute: Callable[[TaskColumns], dict]) -> dict:
+        entry = self._entries.get(project_id)
+        if entry is not None and not entry["pending"]:
+            self._entries.move_to_end(project_id)
+            result = entry["results"].get(key)
+            if result is not None:
+                entry["results"].move_to_end(key)
+                self.hits += 1
+                return result
+        self.misses += 1
+
+        entry = await self._current(project_id)
+        result = await run_in_threadpool(compute, entry["columns"])
+        results = entry["results"]
+        results[key] = result
+        while len(results) > settings.ANALYTICS_BURNDOWN_RESULTS_PER_PROJECT:
+            results.popitem(last=False)
+        return result
+
+    async def _current(self, project_id: str) -> dict:
+        inflight = self._inflight.get(project_id)
+        if inflight is not None:
+            # shield so that a cancelled waiter does not cancel the shared load
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[project_id] = future
+        try:
+            entry = self._entries.get(project_id)
+            if entry is None:
+                columns = await run_in_threadpool(load_columns, project_id)
+                self.loads += 1
+                entry = {"columns": columns, "results": OrderedDict(), "pending": self._early.pop(project_id, set())}
+                self._entries[project_id] = entry
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            while entry["pending"]:
+                task_ids, entry["pending"] = list(entry["pending"]), set()
+                entry["columns"] = await run_in_threadpool(self._patch, project_id, entry["columns"], task_ids)
+                entry["results"].clear()
+                self.patches += 1
+        except Exception as exc:
+            self._entries.pop(project_id, None)
+            self._early.pop(project_id, None)
+            future.set_exception(exc)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._inflight[project_id]
+        future.set_result(entry)
+        return entry
+
+    @staticmethod
+    def _patch(project_id: str, columns: TaskColumns, task_ids: list) -> TaskColumns:
+        return patch_columns(columns, task_ids, load_columns(project_id, task_ids))
+
+    def invalidate(self, task_rows: list):
+        """Queue the task_facts rows of a flush for the projects that are cached"""
+        for row in task_rows:
+            project_id = str(row["projectId"])
+            entry = self._entries.get(project_id)
+            if entry is not None:
+                entry["pending"].add(row["taskId"])
+                entry["results"].clear()
+            elif project_id in self._inflight:
+                self._early.setdefault(project_id, set()).add(row["taskId"])
+        for project_id, entry in list(self._entries.items()):
+            # Cheaper to reload than to patch most of the rows
+            if len(entry["pending"]) > max(1000, len(entry["columns"]) // 4):
+                del self._entries[project_id]
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "patches": self.patches
+        }
+
+
+burndown_cache = ProjectResultCache(settings.ANALYTICS_BURNDOWN_CACHE_SIZE)
@@ -0,0 +1,31 @@
+import httpx
+from config import settings
+
+
+class HttpClient:
+    """Shared keep-alive client for calls to other services"""
+
+    def __init__(self):
+        self.client = None
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                settings.HTTP_TIMEOUT,
+                connect=settings.HTTP_CONNECT_TIMEOUT,
+                pool=settings.HTTP_POOL_TIMEOUT
+            ),
+            http2=settings.HTTP2_ENABLED
+        )
+
+    async def stop(self):
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+http_client = HttpClient()
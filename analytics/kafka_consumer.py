@@ -0,0 +1,203 @@
+import asyncio
+import json
+import time
+from collections import namedtuple
+from aiokafka import AIOKafkaConsumer, ConsumerRebalanceListener
+from aiokafka.errors import KafkaConnectionError
+from aiokafka.structs import TopicPartition
+from starlette.concurrency import run_in_threadpool
+from burndown import burndown_cache
+from config import settings
+from metrics import Histogram, LATENCY_BUCKETS
+from rollup_store import load_state, write_changes
+from rollups import MetricsEngine, metrics_engine
+
+BATCH_SIZE_BUCKETS = (1, 5, 10, 50, 100, 250, 500, 1000)
+TOPICS = ['projects-events', 'tasks-events']
+
+BrokerMessage = namedtuple("BrokerMessage", ["topic", "partition", "offset", "timestamp", "value"])
+
+
+class InMemoryBroker:
+    """Stand-in for AIOKafkaConsumer: one partition per topic, kept in process"""
+
+    def __init__(self):
+        self.topics = {}
+        self.positions = {}
+
+    def publish(self, topic: str, event: dict, timestamp: float = None):
+        messages = self.topics.setdefault(topic, [])
+        messages.append(BrokerMessage(topic, 0, len(messages), int((timestamp or time.time()) * 1000), event))
+
+    def seek(self, tp: TopicPartition, offset: int):
+        self.positions[tp] = offset
+
+    async def getmany(self, timeout_ms: int = 0, max_records: int = None):
+        batches = {}
+        budget = max_records or float("inf")
+        for topic, messages in self.topics.items():
+            tp = TopicPartition(topic, 0)
+            start = self.positions.get(tp, 0)
+            batch = messages[start:start + int(min(budget, len(messages)))]
+            if batch:
+                batches[tp] = batch
+                self.positions[tp] = start + len(batch)
+                budget -= len(batch)
+            if budget <= 0:
+                break
+        if not batches:
+            await asyncio.sleep(timeout_ms / 1000)
+        return batches
+
+    async def stop(self):
+        pass
+
+
+class SeekToStoredOffsets(ConsumerRebalanceListener):
+    def __init__(self, analytics_consumer):
+        self.analytics_consumer = analytics_consumer
+
+    async def on_partitions_revoked(self, revoked):
+        # Offsets live next to the rollups, so there is nothing to commit to Kafka
+        pass
+
+    async def on_partitions_assigned(self, assigned):
+        self.analytics_consumer.seek_to_stored(assigned)
+
+
+class AnalyticsConsumer:
+    """Consumes projects-events and tasks-events into the in-memory rollups.
+
+    Offsets are stored in the analytics database together with the
+    rollups they produced, and the consumer seeks to them on assignment,
+    so every event is counted exactly once across restarts. The rollups
+    cover all partitions, so the service runs as a single instance.
+    """
+
+    def __init__(self, metrics: MetricsEngine = metrics_engine, source=None):
+        self.metrics = metrics
+        # AIOKafkaConsumer, or an InMemoryBroker in tests and benchmarks
+        self.source = source
+        self.task = None
+        self.pending_write = None
+        self.last_flush = time.monotonic()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.flush_latency = Histogram(LATENCY_BUCKETS)
+        self.flushes = 0
+        self.flush_failures = 0
+
+    async def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+            if self.pending_write:
+                await asyncio.wait([self.pending_write])
+            # Keep what was folded since the last flush
+            await self.flush()
+        if self.source:
+            await self.source.stop()
+
+    async def run(self):
+        await run_in_threadpool(load_state, self.metrics)
+        if self.source is None:
+            self.source = await self._connect()
+        else:
+            self.seek_to_stored([TopicPartition(topic, partition) for topic, partition in self.metrics.offsets])
+        self.last_flush = time.monotonic()
+
+        while True:
+            batches = await self.source.getmany(
+                timeout_ms=settings.KAFKA_CONSUMER_TIMEOUT_MS,
+                max_records=settings.KAFKA_CONSUMER_MAX_RECORDS
+            )
+            if batches:
+                self.consume(batches)
+            if time.monotonic() - self.last_flush >= settings.ANALYTICS_FLUSH_INTERVAL_S:
+                await self.flush()
+
+    def consume(self, batches: dict) -> int:
+        oldest = self.metrics.oldest_buckets()
+        messages = 0
+        for partition_messages in batches.values():
+            for message in partition_messages:
+                if message.value is not None:
+                    self.metrics.apply(message.topic, message.partition, message.offset, message.timestamp, message.value, oldest)
+            messages += len(partition_messages)
+        self.batch_sizes.observe(messages)
+        return messages
+
+    async def flush(self):
+        self.last_flush = time.monotonic()
+        changes = self.metrics.drain_changes()
+        if not changes["offsets"]:
+            return
+        # Shielded so that stop() cannot abandon a write halfway and start an overlapping one
+        self.pending_write = asyncio.ensure_future(self._write(changes))
+        await asyncio.shield(self.pending_write)
+
+    async def _write(self, changes: dict):
+        started = time.perf_counter()
+        try:
+            await run_in_threadpool(write_changes, changes, self.metrics.oldest_buckets())
+        except Exception as e:
+            # Values stay in memory and go out with the next flush
+            self.metrics.mark_dirty(changes)
+            self.flush_failures += 1
+            print(f"Analytics flush failed: {e}")
+            return
+        self.flushes += 1
+        self.flush_latency.observe(time.perf_counter() - started)
+        # Burndown reads task_facts, so cached results are stale only once the write is visible
+        burndown_cache.invalidate(changes["tasks"])
+
+    def seek_to_stored(self, partitions):
+        for tp in partitions:
+            offset = self.metrics.offsets.get((tp.topic, tp.partition))
+            if offset is not None:
+                self.source.seek(tp, offset)
+
+    async def _connect(self) -> AIOKafkaConsumer:
+        max_retries = 30
+        retry_delay = 2
+
+        for attempt in range(max_retries):
+            try:
+                consumer = AIOKafkaConsumer(
+                    bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+                    group_id='analytics-consumer-group',
+                    value_deserializer=lambda m: json.loads(m.decode('utf-8')),
+                    enable_auto_commit=False,
+                    # Partitions without a stored offset are read from the start
+                    auto_offset_reset='earliest',
+                    max_poll_records=settings.KAFKA_CONSUMER_MAX_RECORDS
+                )
+                consumer.subscribe(TOPICS, listener=SeekToStoredOffsets(self))
+                await consumer.start()
+                print(f"Successfully connected to Kafka at {settings.KAFKA_BOOTSTRAP_SERVERS}")
+                return consumer
+            except KafkaConnectionError:
+                if attempt < max_retries - 1:
+                    print(f"Kafka connection attempt {attempt + 1}/{max_retries} failed, retrying in {retry_delay}s...")
+                    await asyncio.sleep(retry_delay)
+                else:
+                    print("Failed to connect to Kafka after all retries")
+                    raise
+
+    def stats(self) -> dict:
+        return {
+            **self.metrics.stats(),
+            "batch_sizes": self.batch_sizes.snapshot(),
+            "flush_seconds": self.flush_latency.snapshot(),
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures
+        }
+
+
+analytics_consumer = AnalyticsConsumer()
@@ -0,0 +1,169 @@
+from fastapi import FastAPI, Depends, HTTPException, Query
+from typing import Optional
+from datetime import date, datetime
+import uuid
+from contextlib import asynccontextmanager
+
+from config import settings
+from database import Base, engine, ensure_indexes
+from schemas import AssigneeMetrics, Burndown, MetricPoint, MetricTotals, ProjectMetrics, Velocity
+from auth_utils import get_current_user, token_cache
+from burndown import burndown_cache, compute_burndown, compute_velocity, to_day, today
+from kafka_consumer import analytics_consumer
+from rollups import metrics_engine
+from http_client import http_client
+
+Base.metadata.create_all(bind=engine)
+ensure_indexes()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    await http_client.start()
+    await analytics_consumer.start()
+    yield
+    # Shutdown
+    await analytics_consumer.stop()
+    await http_client.stop()
+
+app = FastAPI(title="Analytics Service", lifespan=lifespan)
+
+
+@app.get("/")
+def read_root():
+    return {"message": "Analytics Service"}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "auth_cache": token_cache.stats(),
+        "kafka_consumer": analytics_consumer.stats(),
+        "burndown_cache": burndown_cache.stats()
+    }
+
+
+def parse_id(value: str, name: str) -> str:
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} ID format")
+
+
+def average_cycle_time(completed: int, cycle_seconds: float) -> Optional[float]:
+    return cycle_seconds / completed if completed else None
+
+
+def build_points(scope: str, key: str, granularity: str, since: Optional[datetime], until: Optional[datetime]):
+    """Bucket series and range totals straight from the rollups"""
+    points = metrics_engine.series(scope, key, granularity, since, until)
+    totals = {"created": 0, "completed": 0, "reopened": 0, "cycleSeconds": 0.0}
+    for point in points:
+        for field in totals:
+            totals[field] += point[field]
+    return (
+        [
+            MetricPoint(
+                bucketStart=point["bucketStart"],
+                created=point["created"],
+                completed=point["completed"],
+                reopened=point["reopened"],
+                avgCycleTimeSeconds=average_cycle_time(point["completed"], point["cycleSeconds"])
+            )
+            for point in points
+        ],
+        MetricTotals(
+            created=totals["created"],
+            completed=totals["completed"],
+            reopened=totals["reopened"],
+            avgCycleTimeSeconds=average_cycle_time(totals["completed"], totals["cycleSeconds"])
+        )
+    )
+
+
+@app.get("/analytics/projects/{project_id}", response_model=ProjectMetrics)
+async def get_project_metrics(
+    project_id: str,
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Throughput, cycle time and open tasks per assignee of a project"""
+    project_id = parse_id(project_id, "project")
+    points, totals = build_points("project", project_id, granularity, since, until)
+    open_by_assignee = metrics_engine.open_by_project.get(project_id, {})
+    return ProjectMetrics(
+        projectId=project_id,
+        granularity=granularity,
+        points=points,
+        totals=totals,
+        openTasks=sum(open_by_assignee.values()),
+        unassignedOpenTasks=open_by_assignee.get("", 0),
+        openByAssignee={assignee_id: count for assignee_id, count in open_by_assignee.items() if assignee_id and count},
+        members=metrics_engine.members.get(project_id, 0)
+    )
+
+
+@app.get("/analytics/assignees/{user_id}", response_model=AssigneeMetrics)
+async def get_assignee_metrics(
+    user_id: str,
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Throughput, cycle time and open tasks per project of an assignee"""
+    user_id = parse_id(user_id, "user")
+    points, totals = build_points("assignee", user_id, granularity, since, until)
+    open_by_project = metrics_engine.open_by_assignee.get(user_id, {})
+    return AssigneeMetrics(
+        userId=user_id,
+        granularity=granularity,
+        points=points,
+        totals=totals,
+        openTasks=sum(open_by_project.values()),
+        openByProject={project_id: count for project_id, count in open_by_project.items() if count}
+    )
+
+
+@app.get("/analytics/projects/{project_id}/burndown", response_model=Burndown)
+async def get_project_burndown(
+    project_id: str,
+    since: Optional[date] = Query(None),
+    until: Optional[date] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Daily burndown of a project, from its first task until today by default"""
+    project_id = parse_id(project_id, "project")
+    if since and until and (until - since).days >= settings.ANALYTICS_BURNDOWN_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Burndown range is limited to {settings.ANALYTICS_BURNDOWN_MAX_DAYS} days"
+        )
+    first_day = to_day(since) if since else None
+    last_day = to_day(until) if until else None
+    current_day = today()
+    result = await burndown_cache.get(
+        project_id,
+        ("burndown", first_day, last_day, current_day),
+        lambda columns: compute_burndown(columns, first_day, last_day, current_day)
+    )
+    return Burndown(projectId=project_id, **result)
+
+
+@app.get("/analytics/projects/{project_id}/velocity", response_model=Velocity)
+async def get_project_velocity(
+    project_id: str,
+    sprints: int = Query(12, ge=1, le=104),
+    current_user: dict = Depends(get_current_user)
+):
+    """Completed tasks per sprint and the forecast completion date of the open ones"""
+    project_id = parse_id(project_id, "project")
+    current_day = today()
+    result = await burndown_cache.get(
+        project_id,
+        ("velocity", sprints, current_day),
+        lambda columns: compute_velocity(columns, sprints, current_day)
+    )
+    return Velocity(projectId=project_id, **result)
@@ -0,0 +1,71 @@
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Float, Index, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+from database import Base
+
+
+class MetricBucket(Base):
+    """One hourly or daily rollup bucket of a project or an assignee"""
+    __tablename__ = "metric_buckets"
+
+    scope = Column(String(16), primary_key=True)  # project, assignee
+    key = Column(String, primary_key=True)
+    granularity = Column(String(8), primary_key=True)  # hour, day
+    bucketStart = Column(DateTime, primary_key=True)
+    created = Column(BigInteger, nullable=False, default=0)
+    completed = Column(BigInteger, nullable=False, default=0)
+    reopened = Column(BigInteger, nullable=False, default=0)
+    # Sum of creation-to-completion times of the tasks completed in the bucket
+    cycleSeconds = Column(Float, nullable=False, default=0)
+
+    __table_args__ = (
+        # Pruning of buckets that fell out of the in-memory rings
+        Index("ix_metric_buckets_granularity_start", "granularity", "bucketStart"),
+    )
+
+
+class OpenTaskGauge(Base):
+    """Tasks not yet completed per project and assignee; assigneeId is empty for unassigned tasks"""
+    __tablename__ = "open_task_gauges"
+
+    projectId = Column(String, primary_key=True)
+    assigneeId = Column(String, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class ProjectMemberGauge(Base):
+    __tablename__ = "project_member_gauges"
+
+    projectId = Column(String, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class TaskFact(Base):
+    """Dates of one task as seen in tasks-events, the input of burndown and velocity"""
+    __tablename__ = "task_facts"
+
+    taskId = Column(UUID(as_uuid=True), primary_key=True)
+    projectId = Column(UUID(as_uuid=True), nullable=False)
+    createdAt = Column(DateTime, nullable=False)
+    dueDate = Column(DateTime, nullable=True)
+    # Set when the task entered a done status, cleared when it was reopened
+    completedAt = Column(DateTime, nullable=True)
+    deleted = Column(Boolean, nullable=False, default=False)
+    # occurred_at of the newest event applied; older events arriving late are ignored
+    lastEventAt = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Burndown reads a project's columns with an index-only scan
+        Index(
+            "ix_task_facts_project", "projectId",
+            postgresql_include=["taskId", "createdAt", "dueDate", "completedAt", "deleted"]
+        ),
+    )
+
+
+class ConsumerOffset(Base):
+    """Next offset to read per partition, written in the same transaction as the rollups"""
+    __tablename__ = "consumer_offsets"
+
+    topic = Column(String, primary_key=True)
+    partition = Column(Integer, primary_key=True)
+    offset = Column(BigInteger, nullable=False)
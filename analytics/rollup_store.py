@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database import SessionLocal, engine
+from models import ConsumerOffset, MetricBucket, OpenTaskGauge, ProjectMemberGauge, TaskFact
+from rollups import GRANULARITIES, MetricsEngine
+
+
+def _upsert(conn, model, rows: list, keys: list):
+    if not rows:
+        return
+    stmt = pg_insert(model.__table__)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={column: stmt.excluded[column] for column in rows[0] if column not in keys}
+    ), rows)
+
+
+def _upsert_task_facts(conn, rows: list, keep_completion: bool):
+    if not rows:
+        return
+    stmt = pg_insert(TaskFact.__table__)
+    columns = ["projectId", "createdAt", "dueDate", "completedAt", "deleted", "lastEventAt"]
+    set_ = {column: stmt.excluded[column] for column in columns}
+    if keep_completion:
+        set_["completedAt"] = func.coalesce(TaskFact.completedAt, stmt.excluded.completedAt)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=["taskId"],
+        set_=set_,
+        # Events of one task can arrive out of order from different partitions
+        where=TaskFact.lastEventAt <= stmt.excluded.lastEventAt
+    ), [{column: value for column, value in row.items() if column != "fresh"} for row in rows])
+
+
+def _retained_since(oldest: dict) -> dict:
+    return {
+        granularity: datetime.utcfromtimestamp(max(0, bucket * GRANULARITIES[granularity]))
+        for granularity, bucket in oldest.items()
+    }
+
+
+def write_changes(changes: dict, oldest: dict):
+    """Store drained rollups and the offsets they cover in one transaction.
+
+    Rows hold absolute values, so replaying the same drain is harmless, and
+    the offsets commit atomically with them: after a restart the consumer
+    resumes exactly where the stored rollups end.
+    """
+    with engine.begin() as conn:
+        _upsert(conn, MetricBucket, changes["buckets"], ["scope", "key", "granularity", "bucketStart"])
+        _upsert(conn, OpenTaskGauge, changes["open_tasks"], ["projectId", "assigneeId"])
+        _upsert(conn, ProjectMemberGauge, changes["members"], ["projectId"])
+        _upsert_task_facts(conn, [row for row in changes["tasks"] if row["fresh"]], keep_completion=False)
+        _upsert_task_facts(conn, [row for row in changes["tasks"] if not row["fresh"]], keep_completion=True)
+        _upsert(conn, ConsumerOffset, changes["offsets"], ["topic", "partition"])
+        conn.execute(delete(MetricBucket).where(or_(*(
+            (MetricBucket.granularity == granularity) & (MetricBucket.bucketStart < since)
+            for granularity, since in _retained_since(oldest).items()
+        ))))
+
+
+def load_state(metrics: MetricsEngine):
+    """Rebuild the in-memory rollups from storage before consuming"""
+    oldest = metrics.oldest_buckets()
+    retained_since = _retained_since(oldest)
+    with SessionLocal() as db:
+        for row in db.scalars(select(MetricBucket).where(or_(*(
+            (MetricBucket.granularity == granularity) & (MetricBucket.bucketStart >= since)
+            for granularity, since in retained_since.items()
+        )))):
+            metrics.restore_bucket(
+                row.scope, row.key, row.granularity, row.bucketStart,
+                row.created, row.completed, row.reopened, row.cycleSeconds, oldest
+            )
+        for row in db.scalars(select(OpenTaskGauge)):
+            metrics.restore_open(row.projectId, row.assigneeId, row.count)
+        for row in db.scalars(select(ProjectMemberGauge)):
+            metrics.members[row.projectId] = row.count
+        for row in db.scalars(select(ConsumerOffset)):
+            metrics.offsets[(row.topic, row.partition)] = row.offset
@@ -0,0 +1,349 @@
+import time
+import uuid
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+
+GRANULARITIES = {"hour": 3600, "day": 86400}
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(value: datetime) -> float:
+    """Epoch seconds; naive datetimes are UTC like everywhere in the services"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH).total_seconds()
+
+
+def parse_timestamp(value: str) -> float:
+    return to_epoch(datetime.fromisoformat(value))
+
+
+def merge_completion(older: dict, newer: dict):
+    """Carry the completion of an earlier task_facts row into a newer one.
+
+    A row that reset the completion (``fresh``) stands on its own; one that
+    only saw deletes inherits it; one that saw the task done keeps the
+    earlier completion time if there was one.
+    """
+    if newer["fresh"]:
+        return
+    if newer["completedAt"] is None or older["completedAt"] is not None:
+        newer["completedAt"] = older["completedAt"]
+    newer["fresh"] = older["fresh"]
+
+
+class BucketRing:
+    """The last ``size`` time buckets of one series, stored column-wise in arrays.
+
+    Bucket ``n`` covers [n * width, (n + 1) * width) seconds since the epoch
+    and lives in slot ``n % size``. A newer bucket reclaims the slot, so the
+    ring never grows and never needs a sweep.
+    """
+
+    __slots__ = ("width", "size", "buckets", "created", "completed", "reopened", "cycle_seconds")
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.size = size
+        self.buckets = array("q", [-1]) * size
+        self.created = array("q", [0]) * size
+        self.completed = array("q", [0]) * size
+        self.reopened = array("q", [0]) * size
+        self.cycle_seconds = array("d", [0.0]) * size
+
+    def claim(self, bucket: int, oldest: int) -> int:
+        """Slot holding bucket, reset if it held an older one; -1 if bucket fell out of the ring"""
+        if bucket < oldest:
+            return -1
+        slot = bucket % self.size
+        held = self.buckets[slot]
+        if held == bucket:
+            return slot
+        if held > bucket:
+            return -1
+        self.buckets[slot] = bucket
+        self.created[slot] = 0
+        self.completed[slot] = 0
+        self.reopened[slot] = 0
+        self.cycle_seconds[slot] = 0.0
+        return slot
+
+    def find(self, bucket: int) -> int:
+        slot = bucket % self.size
+        return slot if self.buckets[slot] == bucket else -1
+
+
+class MetricsEngine:
+    """Folds tasks-events and projects-events into per-project and per-assignee rollups.
+
+    Counters (created, completed, reopened and the summed cycle time of
+    completed tasks) live in hourly and daily BucketRings; open tasks and
+    project members are plain gauges. Everything changed since the last
+    flush is tracked so only those rows are written back.
+    """
+
+    def __init__(self):
+        self.sizes = {"hour": settings.ANALYTICS_HOURLY_BUCKETS, "day": settings.ANALYTICS_DAILY_BUCKETS}
+        self.done_statuses = frozenset(settings.ANALYTICS_DONE_STATUSES)
+        self.rings: Dict[Tuple[str, str], Dict[str, BucketRing]] = {}
+        # project -> assignee -> open tasks, and the same numbers indexed by assignee
+        self.open_by_project: Dict[str, Dict[str, int]] = {}
+        self.open_by_assignee: Dict[str, Dict[str, int]] = {}
+        self.members: Dict[str, int] = {}
+        # (topic, partition) -> next offset to read
+        self.offsets: Dict[Tuple[str, int], int] = {}
+
+        self.dirty_buckets = set()
+        self.dirty_open = set()
+        self.dirty_members = set()
+        # task_id -> task_facts row, newest event wins
+        self.dirty_tasks: Dict[str, dict] = {}
+
+        self.events = 0
+        self.skipped = 0
+        self.late = 0
+
+    def oldest_buckets(self, now: Optional[float] = None) -> Dict[str, int]:
+        now = time.time() if now is None else now
+        return {
+            granularity: int(now // width) - self.sizes[granularity] + 1
+            for granularity, width in GRANULARITIES.items()
+        }
+
+    def _rings(self, scope: str, key: str) -> Dict[str, BucketRing]:
+        rings = self.rings.get((scope, key))
+        if rings is None:
+            rings = self.rings[(scope, key)] = {
+                granularity: BucketRing(width, self.sizes[granularity])
+                for granularity, width in GRANULARITIES.items()
+            }
+        return rings
+
+    # Ingest
+
+    def apply(self, topic: str, partition: int, offset: int, timestamp_ms: int, event: dict, oldest: Dict[str, int]):
+        """Fold one consumed message; oldest is oldest_buckets() for the batch"""
+        self.offsets[(topic, partition)] = offset + 1
+        self.events += 1
+        try:
+            if topic == "tasks-events":
+                self._apply_task_event(event, timestamp_ms / 1000, oldest)
+            elif topic == "projects-events":
+                self._apply_project_event(event)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            # A malformed event must not stop the partition
+            print(f"Skipping analytics event at {topic}-{partition}@{offset}: {e!r}")
+            self.skipped += 1
+
+    def _apply_task_event(self, event: dict, fallback_at: float, oldest: Dict[str, int]):
+        event_type = event["event_type"]
+        if event_type not in ("task_created", "task_updated", "task_deleted"):
+            return
+        project_id = event.get("project_id")
+        if not project_id:
+            # Published before task events carried project and status
+            self.skipped += 1
+            return
+
+        at = parse_timestamp(event["occurred_at"]) if event.get("occurred_at") else fallback_at
+        assignee_id = event.get("assignee_id") or ""
+        done = event["status"] in self.done_statuses
+        self._record_task(event, project_id, datetime.utcfromtimestamp(at), done)
+
+        if event_type == "task_created":
+            self._count(project_id, assignee_id, at, oldest, "created")
+            if done:
+                self._count(project_id, assignee_id, at, oldest, "completed")
+            else:
+                self._move_open(project_id, assignee_id, 1)
+        elif event_type == "task_updated":
+            was_done = event["previous_status"] in self.done_statuses
+            cycle_seconds = max(0.0, at - parse_timestamp(event["created_at"])) if done and not was_done else 0.0
+            if not was_done:
+                self._move_open(project_id, event.get("previous_assignee_id") or "", -1)
+            if not done:
+                self._move_open(project_id, assignee_id, 1)
+            if done and not was_done:
+                self._count(project_id, assignee_id, at, oldest, "completed", cycle_seconds)
+            elif was_done and not done:
+                self._count(project_id, assignee_id, at, oldest, "reopened")
+        elif not done:
+            self._move_open(project_id, assignee_id, -1)
+
+    def _record_task(self, event: dict, project_id: str, at: datetime, done: bool):
+        task_id = event["task_id"]
+        row = {
+            "taskId": uuid.UUID(task_id),
+            "projectId": uuid.UUID(project_id),
+            "createdAt": datetime.fromisoformat(event["created_at"]),
+            "dueDate": datetime.fromisoformat(event["due_date"]) if event.get("due_date") else None,
+            "completedAt": None,
+            "deleted": event["event_type"] == "task_deleted",
+            "lastEventAt": at,
+            # False: keep a completedAt already in storage, True: overwrite it
+            "fresh": False
+        }
+        if done and not row["deleted"]:
+            row["completedAt"] = at
+        elif not row["deleted"]:
+            row["completedAt"], row["fresh"] = None, True
+
+        current = self.dirty_tasks.get(task_id)
+        if current is not None:
+            if current["lastEventAt"] > at:
+                return
+            merge_completion(current, row)
+        self.dirty_tasks[task_id] = row
+
+    def _apply_project_event(self, event: dict):
+        event_type = event["event_type"]
+        if event_type == "member_added":
+            delta = 1
+        elif event_type == "member_removed":
+            delta = -1
+        elif event_type == "project_created":
+            delta = 0
+        else:
+            return
+        project_id = event["project_id"]
+        self.members[project_id] = self.members.get(project_id, 0) + delta
+        self.dirty_members.add(project_id)
+
+    def _count(self, project_id: str, assignee_id: str, at: float, oldest: Dict[str, int], counter: str, cycle_seconds: float = 0.0):
+        scopes = [("project", project_id)]
+        if assignee_id:
+            scopes.append(("assignee", assignee_id))
+        for scope, key in scopes:
+            for granularity, ring in self._rings(scope, key).items():
+                bucket = int(at // ring.width)
+                slot = ring.claim(bucket, oldest[granularity])
+                if slot < 0:
+                    self.late += 1
+                    continue
+                getattr(ring, counter)[slot] += 1
+                if cycle_seconds:
+                    ring.cycle_seconds[slot] += cycle_seconds
+                self.dirty_buckets.add((scope, key, granularity, bucket))
+
+    def _move_open(self, project_id: str, assignee_id: str, delta: int):
+        by_assignee = self.open_by_project.setdefault(project_id, {})
+        count = by_assignee.get(assignee_id, 0) + delta
+        by_assignee[assignee_id] = count
+        self.open_by_assignee.setdefault(assignee_id, {})[project_id] = count
+        self.dirty_open.add((project_id, assignee_id))
+
+    # Flush and restore
+
+    def drain_changes(self) -> dict:
+        """Current values of everything changed since the last drain, plus the offsets they cover"""
+        buckets = []
+        for scope, key, granularity, bucket in self.dirty_buckets:
+            ring = self.rings[(scope, key)][granularity]
+            slot = ring.find(bucket)
+            if slot < 0:
+                # Reclaimed by a newer bucket since; storage prunes it
+                continue
+            buckets.append({
+                "scope": scope,
+                "key": key,
+                "granularity": granularity,
+                "bucketStart": datetime.utcfromtimestamp(bucket * ring.width),
+                "created": ring.created[slot],
+                "completed": ring.completed[slot],
+                "reopened": ring.reopened[slot],
+                "cycleSeconds": ring.cycle_seconds[slot]
+            })
+        changes = {
+            "buckets": buckets,
+            "open_tasks": [
+                {"projectId": project_id, "assigneeId": assignee_id, "count": self.open_by_project[project_id][assignee_id]}
+                for project_id, assignee_id in self.dirty_open
+            ],
+            "members": [{"projectId": project_id, "count": self.members[project_id]} for project_id in self.dirty_members],
+            "offsets": [
+                {"topic": topic, "partition": partition, "offset": offset}
+                for (topic, partition), offset in self.offsets.items()
+            ],
+            "tasks": list(self.dirty_tasks.values()),
+            "dirty": (self.dirty_buckets, self.dirty_open, self.dirty_members, self.dirty_tasks)
+        }
+        self.dirty_buckets, self.dirty_open, self.dirty_members, self.dirty_tasks = set(), set(), set(), {}
+        return changes
+
+    def mark_dirty(self, changes: dict):
+        """Put back the keys of a drain whose write failed"""
+        dirty_buckets, dirty_open, dirty_members, dirty_tasks = changes["dirty"]
+        self.dirty_buckets |= dirty_buckets
+        self.dirty_open |= dirty_open
+        self.dirty_members |= dirty_members
+        for task_id, row in dirty_tasks.items():
+            current = self.dirty_tasks.get(task_id)
+            if current is None:
+                self.dirty_tasks[task_id] = row
+            else:
+                merge_completion(row, current)
+
+    def restore_bucket(self, scope: str, key: str, granularity: str, bucket_start: datetime,
+                       created: int, completed: int, reopened: int, cycle_seconds: float, oldest: Dict[str, int]):
+        ring = self._rings(scope, key)[granularity]
+        slot = ring.claim(int(to_epoch(bucket_start) // ring.width), oldest[granularity])
+        if slot < 0:
+            return
+        ring.created[slot] = created
+        ring.completed[slot] = completed
+        ring.reopened[slot] = reopened
+        ring.cycle_seconds[slot] = cycle_seconds
+
+    def restore_open(self, project_id: str, assignee_id: str, count: int):
+        self.open_by_project.setdefault(project_id, {})[assignee_id] = count
+        self.open_by_assignee.setdefault(assignee_id, {})[project_id] = count
+
+    # Queries
+
+    def series(self, scope: str, key: str, granularity: str, since: Optional[datetime], until: Optional[datetime]) -> List[dict]:
+        """Dense buckets of one series between since and until, clipped to the retained range"""
+        width = GRANULARITIES[granularity]
+        now = time.time()
+        first = self.oldest_buckets(now)[granularity]
+        last = int(now // width)
+        if since is not None:
+            first = max(first, int(to_epoch(since) // width))
+        if until is not None:
+            last = min(last, int(to_epoch(until) // width))
+
+        rings = self.rings.get((scope, key))
+        ring = rings[granularity] if rings else None
+        points = []
+        for bucket in range(first, last + 1):
+            slot = ring.find(bucket) if ring else -1
+            if slot < 0:
+                created = completed = reopened = 0
+                cycle_seconds = 0.0
+            else:
+                created, completed = ring.created[slot], ring.completed[slot]
+                reopened, cycle_seconds = ring.reopened[slot], ring.cycle_seconds[slot]
+            points.append({
+                "bucketStart": datetime.utcfromtimestamp(bucket * width),
+                "created": created,
+                "completed": completed,
+                "reopened": reopened,
+                "cycleSeconds": cycle_seconds
+            })
+        return points
+
+    def stats(self) -> dict:
+        return {
+            "events": self.events,
+            "skipped": self.skipped,
+            "late": self.late,
+            "series": len(self.rings),
+            "projects_with_open_tasks": len(self.open_by_project),
+            "dirty": len(self.dirty_buckets) + len(self.dirty_open) + len(self.dirty_members) + len(self.dirty_tasks),
+            "offsets": {f"{topic}-{partition}": offset for (topic, partition), offset in self.offsets.items()}
+        }
+
+
+metrics_engine = MetricsEngine()
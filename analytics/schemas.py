@@ -0,0 +1,56 @@
+from pydantic import BaseModel
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+class MetricTotals(BaseModel):
+    created: int
+    completed: int
+    reopened: int
+    # Mean time from creation to completion of the tasks completed in the range
+    avgCycleTimeSeconds: Optional[float] = None
+
+class MetricPoint(MetricTotals):
+    bucketStart: datetime
+
+class ProjectMetrics(BaseModel):
+    projectId: str
+    granularity: str
+    points: List[MetricPoint]
+    totals: MetricTotals
+    openTasks: int
+    unassignedOpenTasks: int
+    openByAssignee: Dict[str, int]
+    members: int
+
+class AssigneeMetrics(BaseModel):
+    userId: str
+    granularity: str
+    points: List[MetricPoint]
+    totals: MetricTotals
+    openTasks: int
+    openByProject: Dict[str, int]
+
+class Burndown(BaseModel):
+    projectId: str
+    dates: List[date]
+    opened: List[int]
+    closed: List[int]
+    remaining: List[int]
+    # Tasks not yet due on each day
+    plannedRemaining: List[int]
+    overdue: List[int]
+    closedMovingAverage: List[float]
+    forecastCompletionDate: Optional[date] = None
+
+class SprintVelocity(BaseModel):
+    start: date
+    end: date
+    completed: int
+    movingAverage: float
+
+class Velocity(BaseModel):
+    projectId: str
+    sprintDays: int
+    sprints: List[SprintVelocity]
+    openTasks: int
+    forecastCompletionDate: Optional[date] = None
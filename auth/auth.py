@@ -1,22 +1,21 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.models import User, RefreshToken, RoleEnum
 from schemas import UserCreate
 from config import settings
+from hashing import password_hasher
 import uuid
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
 
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    return await password_hasher.hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -25,24 +24,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    
+
     to_encode.update({"exp": expire, "type": "access"})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
-def create_refresh_token(db: Session, user_id: str) -> str:
+async def create_refresh_token(db: AsyncSession, user_id: str) -> str:
     token_data = {
         "sub": str(user_id),
         "type": "refresh",
         "jti": str(uuid.uuid4())
     }
-    
+
     expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     token_data.update({"exp": expire})
-    
+
     encoded_jwt = jwt.encode(token_data, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    
+
     # Save refresh token to database
     db_token = RefreshToken(
         user_id=user_id,
@@ -51,8 +50,8 @@ def create_refresh_token(db: Session, user_id: str) -> str:
         is_revoked="false"
     )
     db.add(db_token)
-    db.commit()
-    
+    await db.commit()
+
     return encoded_jwt
 
 
@@ -66,17 +65,17 @@ def verify_token(token: str, token_type: str = "access"):
         return None
 
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.passwordHash):
+    if not await verify_password(password, user.passwordHash):
         return None
     return user
 
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: UserCreate):
+    hashed_password = await get_password_hash(user.password)
     db_user = User(
         name=user.name,
         email=user.email,
@@ -84,62 +83,80 @@ def create_user(db: Session, user: UserCreate):
         role=user.role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-def get_user_by_id(db: Session, user_id: str):
-    return db.query(User).filter(User.id == user_id).first()
+async def get_user_by_id(db: AsyncSession, user_id: str):
+    try:
+        user_uuid = uuid.UUID(str(user_id))
+    except ValueError:
+        return None
+    return await db.get(User, user_uuid)
 
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def get_users_by_ids(db: AsyncSession, user_ids: List[str]):
+    ids = set()
+    for user_id in user_ids:
+        try:
+            ids.add(uuid.UUID(user_id))
+        except ValueError:
+            continue
+    if not ids:
+        return []
+    return (await db.scalars(select(User).where(User.id.in_(ids)))).all()
 
 
-def update_user(db: Session, user_id: str, name: Optional[str], email: Optional[str], password: Optional[str], role: Optional[RoleEnum]):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(User).where(User.email == email))
+
+
+async def update_user(db: AsyncSession, user_id: str, name: Optional[str], email: Optional[str], password: Optional[str], role: Optional[RoleEnum]):
+    user = await get_user_by_id(db, user_id)
     if not user:
         return None
-    
+
     if name is not None:
         user.name = name
     if email is not None:
         user.email = email
     if password is not None:
-        user.passwordHash = get_password_hash(password)
+        user.passwordHash = await get_password_hash(password)
     if role is not None:
         user.role = role
-    
-    db.commit()
-    db.refresh(user)
+
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
-def delete_user(db: Session, user_id: str):
-    user = db.query(User).filter(User.id == user_id).first()
+async def delete_user(db: AsyncSession, user_id: str):
+    user = await get_user_by_id(db, user_id)
     if not user:
         return None
-    
+
     # Delete all refresh tokens for this user
-    db.query(RefreshToken).filter(RefreshToken.user_id == user_id).delete()
-    
-    db.delete(user)
-    db.commit()
+    await db.execute(delete(RefreshToken).where(RefreshToken.user_id == user.id))
+
+    await db.delete(user)
+    await db.commit()
     return user
 
 
-def revoke_refresh_token(db: Session, token: str):
-    db_token = db.query(RefreshToken).filter(RefreshToken.token == token).first()
+async def revoke_refresh_token(db: AsyncSession, token: str):
+    db_token = await db.scalar(select(RefreshToken).where(RefreshToken.token == token))
     if db_token:
         db_token.is_revoked = "true"
-        db.commit()
+        await db.commit()
     return db_token
 
 
-def get_refresh_token(db: Session, token: str):
-    return db.query(RefreshToken).filter(
-        RefreshToken.token == token,
-        RefreshToken.is_revoked == "false",
-        RefreshToken.expires_at > datetime.utcnow()
-    ).first()
+async def get_refresh_token(db: AsyncSession, token: str):
+    return await db.scalar(
+        select(RefreshToken).where(
+            RefreshToken.token == token,
+            RefreshToken.is_revoked == "false",
+            RefreshToken.expires_at > datetime.utcnow()
+        )
+    )
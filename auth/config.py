@@ -8,6 +8,24 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
+    # Use create_async_engine/asyncpg instead of psycopg2 in the threadpool
+    DB_ASYNC: bool = False
+
+    # SQLAlchemy connection pool
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    # NullPool and no prepared statement cache, for PgBouncer transaction pooling
+    DB_PGBOUNCER_MODE: bool = False
+
+    # bcrypt worker pool: "thread" or "process"
+    HASH_POOL_KIND: str = "thread"
+    HASH_POOL_WORKERS: int = 4
+    HASH_QUEUE_SIZE: int = 64
+    HASH_RETRY_AFTER_SECONDS: int = 1
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from config import settings
+from metrics import Histogram, LATENCY_BUCKETS
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class HashPoolSaturated(Exception):
+    """Raised when the hashing queue is full and the request should be retried"""
+
+
+def _run_timed(fn, *args):
+    # Runs inside the worker; the start time lets the caller measure queue wait
+    return time.monotonic(), fn(*args)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded worker pool so it never blocks the event loop"""
+
+    def __init__(self):
+        self.executor = None
+        self.pending = 0
+        self.rejected = 0
+        self.wait_time = Histogram(LATENCY_BUCKETS)
+        self.hash_time = Histogram(LATENCY_BUCKETS)
+
+    def start(self):
+        if settings.HASH_POOL_KIND == "process":
+            self.executor = ProcessPoolExecutor(max_workers=settings.HASH_POOL_WORKERS)
+        else:
+            self.executor = ThreadPoolExecutor(
+                max_workers=settings.HASH_POOL_WORKERS,
+                thread_name_prefix="bcrypt"
+            )
+
+    def stop(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.pending - settings.HASH_POOL_WORKERS, 0)
+
+    async def _submit(self, fn, *args):
+        if self.executor is None:
+            self.start()
+        if self.queue_depth >= settings.HASH_QUEUE_SIZE:
+            self.rejected += 1
+            raise HashPoolSaturated()
+
+        self.pending += 1
+        enqueued_at = time.monotonic()
+        try:
+            started_at, result = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _run_timed, fn, *args
+            )
+        finally:
+            self.pending -= 1
+
+        self.wait_time.observe(started_at - enqueued_at)
+        self.hash_time.observe(time.monotonic() - started_at)
+        return result
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(_verify, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password)
+
+    def stats(self) -> dict:
+        return {
+            "kind": settings.HASH_POOL_KIND,
+            "workers": settings.HASH_POOL_WORKERS,
+            "in_flight": self.pending,
+            "queue_depth": self.queue_depth,
+            "queue_size": settings.HASH_QUEUE_SIZE,
+            "rejected": self.rejected,
+            "wait_seconds": self.wait_time.snapshot(),
+            "hash_seconds": self.hash_time.snapshot()
+        }
+
+
+password_hasher = PasswordHasher()
@@ -1,36 +1,63 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from typing import List
+from contextlib import asynccontextmanager
 
-from database import get_db, engine, Base
+from database import get_db, engine, Base, pool_stats
 from schemas import (
     UserCreate, UserUpdate, UserResponse, LoginRequest, 
-    TokenResponse, RefreshRequest, RoleResponse, RoleEnum
+    TokenResponse, RefreshRequest, RoleResponse, RoleEnum,
+    UserBatchGetRequest, UserBatchGetResponse
 )
 from models.models import User
+from config import settings
+from hashing import password_hasher, HashPoolSaturated
 import auth
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Auth Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    password_hasher.start()
+    yield
+    # Shutdown
+    password_hasher.stop()
+
+app = FastAPI(title="Auth Service", lifespan=lifespan)
 
 security = HTTPBearer()
 
 
+@app.exception_handler(HashPoolSaturated)
+async def hash_pool_saturated_handler(request: Request, exc: HashPoolSaturated):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many concurrent logins, try again later"},
+        headers={"Retry-After": str(settings.HASH_RETRY_AFTER_SECONDS)}
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return {"password_hashing": password_hasher.stats(), "db_pool": pool_stats()}
+
 
 @app.post("/auth/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    existing_user = auth.get_user_by_email(db, user.email)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    existing_user = await auth.get_user_by_email(db, user.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    db_user = auth.create_user(db, user)
+    db_user = await auth.create_user(db, user)
     
     return UserResponse(
         id=str(db_user.id),
@@ -42,8 +69,8 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @app.post("/auth/login", response_model=TokenResponse)
-def login(request: LoginRequest, db: Session = Depends(get_db)):
-    user = auth.authenticate_user(db, request.email, request.password)
+async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
+    user = await auth.authenticate_user(db, request.email, request.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -51,9 +78,9 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
         )
     
     access_token = auth.create_access_token(
-        data={"sub": str(user.id), "email": user.email, "role": user.role.value}
+        data={"sub": str(user.id), "email": user.email, "name": user.name, "role": user.role.value}
     )
-    refresh_token = auth.create_refresh_token(db, str(user.id))
+    refresh_token = await auth.create_refresh_token(db, str(user.id))
     
     return TokenResponse(
         access_token=access_token,
@@ -62,7 +89,7 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
 
 
 @app.post("/auth/refresh", response_model=TokenResponse)
-def refresh(request: RefreshRequest, db: Session = Depends(get_db)):
+async def refresh(request: RefreshRequest, db: AsyncSession = Depends(get_db)):
     payload = auth.verify_token(request.refresh_token, token_type="refresh")
     if not payload:
         raise HTTPException(
@@ -70,7 +97,7 @@ def refresh(request: RefreshRequest, db: Session = Depends(get_db)):
             detail="Invalid refresh token"
         )
     
-    db_token = auth.get_refresh_token(db, request.refresh_token)
+    db_token = await auth.get_refresh_token(db, request.refresh_token)
     if not db_token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -78,7 +105,7 @@ def refresh(request: RefreshRequest, db: Session = Depends(get_db)):
         )
     
     user_id = payload.get("sub")
-    user = auth.get_user_by_id(db, user_id)
+    user = await auth.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -86,11 +113,11 @@ def refresh(request: RefreshRequest, db: Session = Depends(get_db)):
         )
     
     access_token = auth.create_access_token(
-        data={"sub": str(user.id), "email": user.email, "role": user.role.value}
+        data={"sub": str(user.id), "email": user.email, "name": user.name, "role": user.role.value}
     )
-    new_refresh_token = auth.create_refresh_token(db, str(user.id))
+    new_refresh_token = await auth.create_refresh_token(db, str(user.id))
     
-    auth.revoke_refresh_token(db, request.refresh_token)
+    await auth.revoke_refresh_token(db, request.refresh_token)
     
     return TokenResponse(
         access_token=access_token,
@@ -99,10 +126,10 @@ def refresh(request: RefreshRequest, db: Session = Depends(get_db)):
 
 
 @app.post("/auth/logout")
-def logout(
+async def logout(
     request: RefreshRequest,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
 
     payload = auth.verify_token(credentials.credentials, token_type="access")
@@ -112,15 +139,15 @@ def logout(
             detail="Invalid access token"
         )
     
-    auth.revoke_refresh_token(db, request.refresh_token)
+    await auth.revoke_refresh_token(db, request.refresh_token)
     
     return {"message": "Successfully logged out"}
 
 
 @app.get("/auth/validate")
-def validate_token(
+async def validate_token(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Validate access token and return user info"""
     payload = auth.verify_token(credentials.credentials, token_type="access")
@@ -131,7 +158,7 @@ def validate_token(
         )
     
     user_id = payload.get("sub")
-    user = auth.get_user_by_id(db, user_id)
+    user = await auth.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -148,9 +175,9 @@ def validate_token(
 
 # User CRUD endpoints
 @app.get("/auth/users/{user_id}", response_model=UserResponse)
-def get_user(user_id: str, db: Session = Depends(get_db)):
+async def get_user(user_id: str, db: AsyncSession = Depends(get_db)):
 
-    user = auth.get_user_by_id(db, user_id)
+    user = await auth.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -166,22 +193,41 @@ def get_user(user_id: str, db: Session = Depends(get_db)):
     )
 
 
+@app.post("/auth/users:batchGet", response_model=UserBatchGetResponse)
+async def batch_get_users(request: UserBatchGetRequest, db: AsyncSession = Depends(get_db)):
+    """Resolve many users in one query; unknown ids are omitted"""
+    users = await auth.get_users_by_ids(db, request.ids)
+
+    return UserBatchGetResponse(
+        users=[
+            UserResponse(
+                id=str(user.id),
+                name=user.name,
+                email=user.email,
+                role=user.role,
+                createdAt=user.createdAt
+            )
+            for user in users
+        ]
+    )
+
+
 @app.put("/auth/users/{user_id}", response_model=UserResponse)
-def update_user_endpoint(
+async def update_user_endpoint(
     user_id: str,
     user_update: UserUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
 
     if user_update.email:
-        existing_user = auth.get_user_by_email(db, user_update.email)
+        existing_user = await auth.get_user_by_email(db, user_update.email)
         if existing_user and str(existing_user.id) != user_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
     
-    updated_user = auth.update_user(
+    updated_user = await auth.update_user(
         db, user_id, user_update.name, user_update.email, user_update.password, user_update.role
     )
     
@@ -201,9 +247,9 @@ def update_user_endpoint(
 
 
 @app.delete("/auth/users/{user_id}")
-def delete_user_endpoint(user_id: str, db: Session = Depends(get_db)):
+async def delete_user_endpoint(user_id: str, db: AsyncSession = Depends(get_db)):
 
-    deleted_user = auth.delete_user(db, user_id)
+    deleted_user = await auth.delete_user(db, user_id)
     if not deleted_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -215,7 +261,7 @@ def delete_user_endpoint(user_id: str, db: Session = Depends(get_db)):
 
 
 @app.get("/auth/roles", response_model=RoleResponse)
-def get_roles():
+async def get_roles():
 
     return RoleResponse(roles=[role.value for role in RoleEnum])
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -36,6 +36,14 @@ class UserResponse(UserBase):
         from_attributes = True
 
 
+class UserBatchGetRequest(BaseModel):
+    ids: List[str] = Field(..., max_length=1000)
+
+
+class UserBatchGetResponse(BaseModel):
+    users: List[UserResponse]
+
+
 class LoginRequest(BaseModel):
     email: EmailStr
     password: str
@@ -1,22 +1,54 @@
 import httpx
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import JWTError, jwt
 from config import settings
+from http_client import http_client
+from token_cache import TokenCache
 
 security = HTTPBearer()
+token_cache = TokenCache(settings.AUTH_CACHE_MAX_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+
+def verify_token_locally(token: str) -> dict:
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if payload.get("type") != "access" or not payload.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    return {
+        "id": payload["sub"],
+        "email": payload.get("email"),
+        "name": payload.get("name"),
+        "role": payload.get("role")
+    }
+
+async def validate_token_remotely(token: str) -> dict:
+    try:
+        response = await http_client.client.get(
+            f"{settings.AUTH_SERVICE_URL}/auth/validate",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+    except httpx.RequestError:
+        raise HTTPException(status_code=503, detail="Auth service unavailable")
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    return response.json()
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{settings.AUTH_SERVICE_URL}/auth/validate",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            if response.status_code != 200:
-                raise HTTPException(status_code=401, detail="Invalid token")
-            
-            return response.json()
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Auth service unavailable")
+
+    if settings.AUTH_MODE == "local":
+        user = verify_token_locally(token)
+        # Удалённых пользователей знает только auth сервис
+        if not settings.AUTH_REVOCATION_CHECK:
+            return user
+
+    if settings.AUTH_CACHE_ENABLED:
+        return await token_cache.get_or_load(token, validate_token_remotely)
+
+    return await validate_token_remotely(token)
@@ -1,15 +1,185 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from starlette.concurrency import run_in_threadpool
+import threading
+import time
 from config import settings
+from metrics import Histogram, LATENCY_BUCKETS
+
+
+class PoolMetrics:
+    """Checkout wait times and timeouts shared by the sync and async pools"""
+
+    def __init__(self):
+        self.checkout_wait = Histogram(LATENCY_BUCKETS)
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+
+pool_metrics = PoolMetrics()
+
+
+class _TimedCheckoutMixin:
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record_timeout()
+            raise
+        finally:
+            pool_metrics.checkout_wait.observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _engine_options(poolclass, async_driver: bool = False) -> dict:
+    if settings.DB_PGBOUNCER_MODE:
+        # PgBouncer owns pooling; prepared statements do not survive transaction pooling
+        options = {"poolclass": NullPool}
+        if async_driver:
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return options
+
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING
+    }
+
+
+engine = create_engine(settings.DATABASE_URL, **_engine_options(TimedQueuePool))
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC:
+    async_engine = create_async_engine(
+        make_url(settings.DATABASE_URL).set(drivername="postgresql+asyncpg"),
+        **_engine_options(TimedAsyncQueuePool, async_driver=True)
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+def ensure_columns():
+    """Add columns added to existing tables; create_all never alters a table"""
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.exec_driver_sql(
+                        f"ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} "
+                        f"ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}"
+                    )
+
+
+def ensure_indexes():
+    """Create indexes added to existing tables; create_all only handles new tables"""
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+
+def _pool_gauges(pool) -> dict:
+    if isinstance(pool, NullPool):
+        return {"class": "NullPool"}
+    return {
+        "class": type(pool).__name__,
+        "size": pool.size(),
+        "in_use": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": pool.overflow()
+    }
+
+
+def pool_stats() -> dict:
+    stats = {
+        "sync": _pool_gauges(engine.pool),
+        "checkout_wait_seconds": pool_metrics.checkout_wait.snapshot(),
+        "timeouts": pool_metrics.timeouts
+    }
+    if async_engine is not None:
+        stats["async"] = _pool_gauges(async_engine.pool)
+    return stats
+
+
+class ThreadedSession:
+    """AsyncSession-compatible wrapper that runs a sync Session in the threadpool.
+
+    Lets the endpoints use one awaitable data-access API whether DB_ASYNC
+    is enabled or not, without blocking the event loop in either mode.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, params, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def refresh(self, instance):
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+
+async def get_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = ThreadedSession(SessionLocal())
+        try:
+            yield db
+        finally:
+            await db.close()
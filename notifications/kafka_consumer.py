@@ -1,61 +1,273 @@
 import asyncio
 import json
-from aiokafka import AIOKafkaConsumer
-from aiokafka.errors import KafkaConnectionError
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import Notification
+import time
+from aiokafka import AIOKafkaConsumer, ConsumerRebalanceListener
+from aiokafka.errors import KafkaConnectionError, KafkaError
+from notification_writer import WriteFailed, notification_writer
+from notification_hub import notification_hub
 from config import settings
+from metrics import Histogram, LATENCY_BUCKETS
 import uuid
+from datetime import datetime
+
+BATCH_SIZE_BUCKETS = (1, 5, 10, 50, 100, 250, 500, 1000)
+
+
+class ConsumerStats:
+    """Счётчики пакетной обработки для /metrics"""
+
+    def __init__(self):
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.flush_latency = Histogram(LATENCY_BUCKETS)
+        self.messages = 0
+        self.skipped = 0
+        self.coalesced = 0
+        # Уведомления, которые не удалось записать
+        self.dropped = 0
+        self.flush_failures = 0
+        self.commit_failures = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "messages": self.messages,
+            "skipped": self.skipped,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "flush_failures": self.flush_failures,
+            "commit_failures": self.commit_failures,
+            "batch_sizes": self.batch_sizes.snapshot(),
+            "flush_seconds": self.flush_latency.snapshot(),
+            "workers": [{"index": worker.index, "partitions": worker.assignment()} for worker in workers]
+        }
+
+
+consumer_stats = ConsumerStats()
+
+
+class RevokeListener(ConsumerRebalanceListener):
+    def __init__(self, worker):
+        self.worker = worker
+
+    async def on_partitions_revoked(self, revoked):
+        await self.worker.on_revoked(revoked)
+
+    async def on_partitions_assigned(self, assigned):
+        print(f"Consumer worker {self.worker.index} assigned {sorted((tp.topic, tp.partition) for tp in assigned)}")
+
+
+class ConsumerWorker:
+    """Отдельный член consumer group: владеет своей частью партиций.
+
+    Продюсеры используют userId получателя как ключ, поэтому события одного
+    пользователя приходят в одну партицию и обрабатываются одним воркером по порядку.
+    """
+
+    def __init__(self, index: int):
+        self.index = index
+        self.consumer = None
+        # Удерживается на время записи пакета и коммита офсетов
+        self.batch_lock = asyncio.Lock()
+        self.coalescer = NotificationCoalescer()
+
+    async def start(self):
+        max_retries = 30
+        retry_delay = 2
+
+        for attempt in range(max_retries):
+            try:
+                self.consumer = AIOKafkaConsumer(
+                    bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+                    group_id='notifications-consumer-group',
+                    client_id=f'notifications-consumer-{self.index}',
+                    value_deserializer=lambda m: json.loads(m.decode('utf-8')),
+                    # Офсеты коммитим сами, только после записи пакета в БД
+                    enable_auto_commit=False,
+                    max_poll_records=settings.KAFKA_CONSUMER_MAX_RECORDS
+                )
+                self.consumer.subscribe(['projects-events', 'tasks-events'], listener=RevokeListener(self))
+                await self.consumer.start()
+                print(f"Consumer worker {self.index} connected to Kafka at {settings.KAFKA_BOOTSTRAP_SERVERS}")
+                return
+            except KafkaConnectionError:
+                if attempt < max_retries - 1:
+                    print(f"Kafka connection attempt {attempt + 1}/{max_retries} failed, retrying in {retry_delay}s...")
+                    await asyncio.sleep(retry_delay)
+                else:
+                    print("Failed to connect to Kafka after all retries")
+                    raise
+
+    async def run(self):
+        await self.start()
+        try:
+            await consume_batches(self.consumer, self.batch_lock, self.coalescer)
+        finally:
+            await self.consumer.stop()
+
+    async def on_revoked(self, revoked):
+        # Пакет в обработке и открытое окно записываются и коммитятся до передачи партиций
+        async with self.batch_lock:
+            await flush(self.consumer, self.coalescer)
+
+    def assignment(self) -> list:
+        if self.consumer is None:
+            return []
+        return sorted(f"{tp.topic}-{tp.partition}" for tp in self.consumer.assignment())
+
+
+workers = []
+
 
 async def consume_kafka_messages():
-    max_retries = 30
-    retry_delay = 2
-    
-    for attempt in range(max_retries):
+    """Запускает NOTIFICATIONS_CONSUMER_WORKERS воркеров в одной consumer group"""
+    workers[:] = [ConsumerWorker(index) for index in range(settings.NOTIFICATIONS_CONSUMER_WORKERS)]
+    await asyncio.gather(*(worker.run() for worker in workers))
+
+async def consume_batches(consumer, batch_lock=None, coalescer=None):
+    batch_lock = batch_lock or asyncio.Lock()
+    coalescer = coalescer or NotificationCoalescer()
+    while True:
+        batches = await consumer.getmany(
+            timeout_ms=coalescer.poll_timeout_ms(),
+            max_records=settings.KAFKA_CONSUMER_MAX_RECORDS
+        )
+
+        async with batch_lock:
+            if batches:
+                messages = coalescer.add(batches)
+                consumer_stats.messages += messages
+                consumer_stats.batch_sizes.observe(messages)
+            if coalescer.due():
+                await flush(consumer, coalescer)
+
+async def flush(consumer, coalescer):
+    """Записывает накопленное окно и только после этого коммитит его офсеты.
+
+    Окно очищается лишь после записи: если она сорвалась, незаписанные строки
+    остаются в окне и пишутся следующим flush, а чтение партиций
+    приостанавливается до успешной записи, чтобы окно не росло. Ошибки не
+    выходят наружу, чтобы не останавливать воркер.
+    """
+    if not coalescer.offsets:
+        return
+
+    started = time.perf_counter()
+    rows, offsets = coalescer.window()
+    if rows:
         try:
-            consumer = AIOKafkaConsumer(
-                'projects-events',
-                'tasks-events',
-                bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
-                group_id='notifications-consumer-group',
-                value_deserializer=lambda m: json.loads(m.decode('utf-8'))
-            )
-            
-            await consumer.start()
-            print(f"Successfully connected to Kafka at {settings.KAFKA_BOOTSTRAP_SERVERS}")
-            
-            try:
-                async for message in consumer:
-                    await process_message(message.value, message.topic)
-            finally:
-                await consumer.stop()
+            dropped = await notification_writer.write(rows)
+        except Exception as e:
+            if isinstance(e, WriteFailed):
+                # Записанное повторно не пишем; офсеты окна коммитятся, когда запишется остальное
+                coalescer.forget(e.written + e.dropped)
+                consumer_stats.dropped += len(e.dropped)
+                notification_hub.publish(e.written)
+            consumer_stats.flush_failures += 1
+            print(f"Error flushing notifications window: {e}")
+            consumer.pause(*consumer.assignment())
+            await asyncio.sleep(settings.KAFKA_CONSUMER_RETRY_BACKOFF_MS / 1000)
             return
-        except KafkaConnectionError:
-            if attempt < max_retries - 1:
-                print(f"Kafka connection attempt {attempt + 1}/{max_retries} failed, retrying in {retry_delay}s...")
-                await asyncio.sleep(retry_delay)
-            else:
-                print("Failed to connect to Kafka after all retries")
-                raise
-
-async def process_message(data: dict, topic: str):
-    db: Session = SessionLocal()
+        consumer_stats.dropped += len(dropped)
+        if dropped:
+            dropped_ids = {row['id'] for row in dropped}
+            rows = [row for row in rows if row['id'] not in dropped_ids]
+        notification_hub.publish(rows)
+    coalescer.clear()
+    if consumer.paused():
+        consumer.resume(*consumer.paused())
+
     try:
-        event_type = data.get('event_type')
-        
-        # Определяем тип уведомления и создаем сообщение
-        notification_data = create_notification_data(event_type, data, topic)
-        
-        if notification_data:
-            notification = Notification(**notification_data)
-            db.add(notification)
-            db.commit()
+        await consumer.commit(offsets)
+    except KafkaError as e:
+        # Например, CommitFailedError при ребалансе: строки уже записаны, а сообщения
+        # получит новый владелец партиции и обработает повторно
+        consumer_stats.commit_failures += 1
+        print(f"Error committing offsets: {e}")
+    consumer_stats.flush_latency.observe(time.perf_counter() - started)
+
+def build_notification(message):
+    """Возвращает (task_id, строка для вставки) или None, если событие не порождает уведомление"""
+    data = message.value
+    try:
+        notification_data = create_notification_data(data.get('event_type'), data, message.topic)
     except Exception as e:
+        # Битое событие не должно блокировать весь пакет
         print(f"Error processing message: {e}")
-        db.rollback()
-    finally:
-        db.close()
+        consumer_stats.skipped += 1
+        return None
+
+    if not notification_data:
+        return None
+    # id и время задаём здесь, чтобы отправить клиентам ту же строку, что записана в БД
+    notification_data.update(id=uuid.uuid4(), isRead=False, count=1, createdAt=datetime.utcnow())
+    return data.get('task_id'), notification_data
+
+
+class NotificationCoalescer:
+    """Окно схлопывания уведомлений одного воркера.
+
+    События с одинаковым (userId, type, task_id), пришедшие в пределах
+    NOTIFICATIONS_COALESCE_WINDOW_S, становятся одним уведомлением со счётчиком:
+    id остаётся от первого события, текст и время берутся из последнего.
+    Офсеты окна коммитятся только после его записи.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.offsets = {}
+        self.opened_at = None
+
+    def add(self, batches: dict) -> int:
+        messages = 0
+        for tp, partition_messages in batches.items():
+            for message in partition_messages:
+                notification = build_notification(message)
+                if notification:
+                    self._merge(*notification)
+            self.offsets[tp] = partition_messages[-1].offset + 1
+            messages += len(partition_messages)
+        if self.opened_at is None:
+            self.opened_at = time.monotonic()
+        return messages
+
+    def _merge(self, task_id, row: dict):
+        key = (row['userId'], row['type'], task_id) if task_id else row['id']
+        current = self.pending.get(key)
+        if current is None:
+            self.pending[key] = row
+            return
+        current.update(
+            title=row['title'],
+            message=row['message'],
+            createdAt=row['createdAt'],
+            count=current['count'] + 1
+        )
+        consumer_stats.coalesced += 1
+
+    def due(self) -> bool:
+        if not self.offsets:
+            return False
+        return (
+            len(self.pending) >= settings.NOTIFICATIONS_COALESCE_MAX_PENDING
+            or time.monotonic() - self.opened_at >= settings.NOTIFICATIONS_COALESCE_WINDOW_S
+        )
+
+    def poll_timeout_ms(self) -> int:
+        # Не ждём новых сообщений дольше, чем осталось до конца окна
+        if self.opened_at is None:
+            return settings.KAFKA_CONSUMER_TIMEOUT_MS
+        remaining = settings.NOTIFICATIONS_COALESCE_WINDOW_S - (time.monotonic() - self.opened_at)
+        return max(0, min(settings.KAFKA_CONSUMER_TIMEOUT_MS, int(remaining * 1000)))
+
+    def window(self):
+        return list(self.pending.values()), dict(self.offsets)
+
+    def forget(self, rows: list):
+        """Убирает из окна уже записанные строки; последующие события по их ключам откроют новые"""
+        ids = {row['id'] for row in rows}
+        self.pending = {key: row for key, row in self.pending.items() if row['id'] not in ids}
+
+    def clear(self):
+        self.pending, self.offsets, self.opened_at = {}, {}, None
 
 def create_notification_data(event_type: str, data: dict, topic: str) -> dict:
     """Создает данные для уведомления на основе типа события"""
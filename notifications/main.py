@@ -1,19 +1,34 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime
 import uuid
 import uvicorn
 from contextlib import asynccontextmanager
 import asyncio
+import argparse
 
-from database import get_db, Base, engine
+from database import get_db, Base, engine, ensure_columns, ensure_indexes, pool_stats
 from models import Notification
-from schemas import NotificationResponse
-from auth_utils import get_current_user, security
-from kafka_consumer import consume_kafka_messages
+from schemas import (
+    NotificationResponse, NotificationPage, UnreadCountResponse, MarkReadRequest, MarkReadResponse
+)
+from pagination import encode_cursor, decode_cursor
+from auth_utils import get_current_user, security, token_cache
+from kafka_consumer import consume_kafka_messages, consumer_stats
+from notification_writer import notification_writer
+from notification_hub import notification_hub
+from http_client import http_client
+from retention import prepare_storage, retention_job
+from config import settings
 
 # Создаем таблицы
 Base.metadata.create_all(bind=engine)
+ensure_columns()
+prepare_storage()
+ensure_indexes()
 
 # Глобальная переменная для задачи Kafka
 kafka_task = None
@@ -22,6 +37,9 @@ kafka_task = None
 async def lifespan(app: FastAPI):
     # Startup: запускаем Kafka consumer
     global kafka_task
+    await http_client.start()
+    notification_writer.start()
+    await retention_job.start()
     kafka_task = asyncio.create_task(consume_kafka_messages())
     yield
     # Shutdown: останавливаем Kafka consumer
@@ -31,6 +49,9 @@ async def lifespan(app: FastAPI):
             await kafka_task
         except asyncio.CancelledError:
             pass
+    notification_writer.stop()
+    await retention_job.stop()
+    await http_client.stop()
 
 app = FastAPI(title="Notifications Service", lifespan=lifespan)
 
@@ -38,13 +59,18 @@ app = FastAPI(title="Notifications Service", lifespan=lifespan)
 def read_root():
     return {"message": "Notifications Service"}
 
-@app.get("/notifications/user/{user_id}", response_model=List[NotificationResponse])
-async def get_user_notifications(
-    user_id: str,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
-):
-    """Получить все уведомления пользователя"""
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "auth_cache": token_cache.stats(),
+        "db_pool": pool_stats(),
+        "kafka_consumer": consumer_stats.snapshot(),
+        "notification_writer": notification_writer.stats(),
+        "push": notification_hub.stats(),
+        "retention": retention_job.stats()
+    }
+
+def parse_own_user_id(user_id: str, current_user: dict) -> uuid.UUID:
     try:
         user_uuid = uuid.UUID(user_id)
     except ValueError:
@@ -53,17 +79,91 @@ async def get_user_notifications(
     # Проверяем, что пользователь запрашивает свои уведомления
     if str(current_user["id"]) != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
+    return user_uuid
+
+@app.get("/notifications/user/{user_id}", response_model=NotificationPage)
+async def get_user_notifications(
+    user_id: str,
+    unread_only: bool = Query(False),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Получить страницу уведомлений пользователя, новые первыми"""
+    user_uuid = parse_own_user_id(user_id, current_user)
+    
+    query = select(Notification).where(Notification.userId == user_uuid)
+    if unread_only:
+        query = query.where(Notification.isRead == False)
+    
+    if cursor:
+        try:
+            last_created_at, last_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(tuple_(Notification.createdAt, Notification.id) < tuple_(last_created_at, last_id))
+    
+    # Лишняя строка показывает, есть ли следующая страница
+    query = query.order_by(Notification.createdAt.desc(), Notification.id.desc()).limit(limit + 1)
+    notifications = (await db.scalars(query)).all()
+    
+    next_cursor = None
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        next_cursor = encode_cursor(notifications[-1].createdAt, notifications[-1].id)
+    
+    return NotificationPage(items=notifications, nextCursor=next_cursor)
+
+@app.get("/notifications/stream")
+async def stream_notifications(current_user: dict = Depends(get_current_user)):
+    """SSE-поток новых уведомлений текущего пользователя"""
+    subscription = notification_hub.subscribe(uuid.UUID(str(current_user["id"])))
+    
+    async def events():
+        try:
+            while True:
+                try:
+                    notification = await subscription.get(settings.NOTIFICATIONS_PUSH_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    # Комментарий держит простаивающее соединение открытым через прокси
+                    yield ": ping\n\n"
+                    continue
+                if notification is None:
+                    # Клиент не успевал читать; после переподключения он догоняет через inbox
+                    yield "event: evicted\ndata: {}\n\n"
+                    return
+                yield f"event: notification\ndata: {NotificationResponse(**notification).model_dump_json()}\n\n"
+        finally:
+            notification_hub.unsubscribe(subscription)
     
-    notifications = db.query(Notification).filter(
-        Notification.userId == user_uuid
-    ).order_by(Notification.createdAt.desc()).all()
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/notifications/user/{user_id}/unread-count", response_model=UnreadCountResponse)
+async def get_unread_count(
+    user_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Количество непрочитанных уведомлений без загрузки строк"""
+    user_uuid = parse_own_user_id(user_id, current_user)
     
-    return notifications
+    unread = await db.scalar(
+        select(func.count()).select_from(Notification).where(
+            Notification.userId == user_uuid,
+            Notification.isRead == False
+        )
+    )
+    return UnreadCountResponse(userId=user_uuid, unread=unread)
 
 @app.put("/notifications/{notification_id}/read", response_model=NotificationResponse)
 async def mark_notification_as_read(
     notification_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """Отметить уведомление как прочитанное"""
@@ -72,9 +172,8 @@ async def mark_notification_as_read(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid notification ID format")
     
-    notification = db.query(Notification).filter(
-        Notification.id == notif_uuid
-    ).first()
+    # createdAt входит в первичный ключ партиционированной таблицы, поэтому ищем по id
+    notification = await db.scalar(select(Notification).where(Notification.id == notif_uuid))
     
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
@@ -84,10 +183,61 @@ async def mark_notification_as_read(
         raise HTTPException(status_code=403, detail="Access denied")
     
     notification.isRead = True
-    db.commit()
-    db.refresh(notification)
+    await db.commit()
+    await db.refresh(notification)
     
     return notification
 
+@app.post("/notifications/read", response_model=MarkReadResponse)
+async def mark_notifications_as_read(
+    request: MarkReadRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Отметить прочитанными уведомления из списка одним UPDATE"""
+    try:
+        ids = {uuid.UUID(notification_id) for notification_id in request.ids}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid notification ID format")
+    
+    # Чужие и уже прочитанные уведомления просто не попадают в счётчик
+    result = await db.execute(
+        update(Notification).where(
+            Notification.userId == uuid.UUID(str(current_user["id"])),
+            Notification.id.in_(ids),
+            Notification.isRead == False
+        ).values(isRead=True).execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    
+    return MarkReadResponse(updated=result.rowcount)
+
+@app.post("/notifications/user/{user_id}/read-all", response_model=MarkReadResponse)
+async def mark_all_notifications_as_read(
+    user_id: str,
+    before: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Отметить прочитанными все уведомления пользователя, созданные до before"""
+    user_uuid = parse_own_user_id(user_id, current_user)
+    
+    query = update(Notification).where(
+        Notification.userId == user_uuid,
+        Notification.isRead == False
+    )
+    if before:
+        query = query.where(Notification.createdAt < before)
+    
+    result = await db.execute(query.values(isRead=True).execution_options(synchronize_session=False))
+    await db.commit()
+    
+    return MarkReadResponse(updated=result.rowcount)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=settings.NOTIFICATIONS_CONSUMER_WORKERS,
+                        help="Kafka consumer workers in this instance")
+    args = parser.parse_args()
+    settings.NOTIFICATIONS_CONSUMER_WORKERS = args.workers
     uvicorn.run(app, host="0.0.0.0", port=8003)
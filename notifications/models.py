@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, Text
+from sqlalchemy import Column, String, Boolean, DateTime, Text, Index, Integer, text
 from sqlalchemy.dialects.postgresql import UUID
 from database import Base
 import uuid
@@ -13,4 +13,34 @@ class Notification(Base):
     title = Column(String(255), nullable=False)
     message = Column(Text, nullable=False)
     isRead = Column(Boolean, default=False)
-    createdAt = Column(DateTime, default=datetime.utcnow)
+    count = Column(Integer, nullable=False, default=1, server_default="1")  # событий, схлопнутых в уведомление
+    # Ключ партиционирования обязан входить в первичный ключ
+    createdAt = Column(DateTime, primary_key=True, default=datetime.utcnow)
+
+    # Postgres читает btree в обратном порядке, поэтому ORDER BY createdAt DESC идёт по индексу.
+    # (userId, isRead, createdAt) обслуживает unread_only и подсчёт непрочитанных index-only scan'ом
+    __table_args__ = (
+        Index("ix_notifications_user_read_created_id", "userId", "isRead", "createdAt", "id"),
+        Index("ix_notifications_user_created_id", "userId", "createdAt", "id"),
+        # Прочитанные по времени создания: по нему retention.archive_read выбирает пакеты
+        Index("ix_notifications_read_created", "createdAt", postgresql_where=text('"isRead"')),
+        # Месячные партиции создаёт и удаляет retention.py
+        {"postgresql_partition_by": 'RANGE ("createdAt")'},
+    )
+
+class NotificationArchive(Base):
+    """Прочитанные старые уведомления и содержимое удалённых партиций"""
+    __tablename__ = "notifications_archive"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    userId = Column(UUID(as_uuid=True), nullable=False)
+    type = Column(String(50), nullable=False)
+    title = Column(String(255), nullable=False)
+    message = Column(Text, nullable=False)
+    count = Column(Integer, nullable=False, default=1)
+    createdAt = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_notifications_archive_user_created", "userId", "createdAt"),
+        Index("ix_notifications_archive_created", "createdAt"),
+    )
@@ -0,0 +1,75 @@
+import asyncio
+import uuid
+from typing import Dict, Optional, Set
+from config import settings
+
+
+class Subscription:
+    """Ограниченная очередь одного подключения"""
+
+    def __init__(self, user_id: uuid.UUID):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=settings.NOTIFICATIONS_PUSH_QUEUE_SIZE)
+        self.evicted = False
+
+    def evict(self):
+        # Очередь полна: освобождаем её и оставляем маркер закрытия потока
+        self.evicted = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """Возвращает уведомление, None при вытеснении; asyncio.TimeoutError, если ничего не пришло"""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class NotificationHub:
+    """In-process fan-out новых уведомлений подключённым клиентам.
+
+    Вызывается из event loop после записи пакета в БД. Медленные клиенты,
+    у которых переполнилась очередь, отключаются, а не тормозят остальных.
+    """
+
+    def __init__(self):
+        self.subscribers: Dict[uuid.UUID, Set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.evicted = 0
+
+    def subscribe(self, user_id: uuid.UUID) -> Subscription:
+        subscription = Subscription(user_id)
+        self.subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self.subscribers.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self.subscribers[subscription.user_id]
+
+    def publish(self, notifications: list):
+        for notification in notifications:
+            self.published += 1
+            for subscription in list(self.subscribers.get(notification['userId'], ())):
+                try:
+                    subscription.queue.put_nowait(notification)
+                    self.delivered += 1
+                except asyncio.QueueFull:
+                    subscription.evict()
+                    self.unsubscribe(subscription)
+                    self.evicted += 1
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self.subscribers),
+            "connections": sum(len(subscriptions) for subscriptions in self.subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "evicted": self.evicted
+        }
+
+
+notification_hub = NotificationHub()
@@ -0,0 +1,165 @@
+import asyncio
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from sqlalchemy import exc, insert
+from database import AsyncSessionLocal, SessionLocal, engine
+from models import Notification
+from config import settings
+from metrics import Histogram, LATENCY_BUCKETS
+
+
+def _init_process():
+    # Соединения родителя после fork не переиспользуем
+    engine.dispose(close=False)
+
+
+def write_rows(rows: list):
+    with SessionLocal() as db:
+        db.execute(insert(Notification), rows)
+        db.commit()
+
+
+def is_transient(error: Exception) -> bool:
+    """Сбой соединения или пула, а не самих данных: запись стоит повторить"""
+    if isinstance(error, exc.DBAPIError):
+        return error.connection_invalidated or isinstance(error, (exc.OperationalError, exc.InterfaceError))
+    return isinstance(error, (exc.TimeoutError, BrokenExecutor, ConnectionError, asyncio.TimeoutError))
+
+
+class WriteFailed(Exception):
+    """Часть строк не записана из-за сбоя соединения или пула.
+
+    written и dropped — строки, которые уже записаны или пропущены из-за ошибки
+    в данных; остальные строки окна нужно записать позже.
+    """
+
+    def __init__(self, error: Exception, written: list, dropped: list):
+        super().__init__(str(error))
+        self.written = written
+        self.dropped = dropped
+
+
+def shard_by_user(rows: list, shards: int) -> list:
+    """Раскладывает строки по шардам так, что все уведомления пользователя попадают в один"""
+    buckets = [[] for _ in range(shards)]
+    for row in rows:
+        buckets[row['userId'].int % shards].append(row)
+    return [bucket for bucket in buckets if bucket]
+
+
+class NotificationWriter:
+    """Пишет уведомления вне event loop, чтобы consumer не останавливал HTTP API"""
+
+    def __init__(self):
+        self.executor = None
+        self.notifications = 0
+        self.write_failures = 0
+        self.dropped = 0
+        self.write_time = Histogram(LATENCY_BUCKETS)
+
+    @property
+    def kind(self) -> str:
+        return "async" if AsyncSessionLocal is not None else settings.NOTIFICATIONS_WRITER_KIND
+
+    def start(self):
+        if self.kind == "process":
+            self.executor = ProcessPoolExecutor(
+                max_workers=settings.NOTIFICATIONS_WRITE_CONCURRENCY,
+                initializer=_init_process
+            )
+        elif self.kind == "thread":
+            self.executor = ThreadPoolExecutor(
+                max_workers=settings.NOTIFICATIONS_WRITE_CONCURRENCY,
+                thread_name_prefix="notifications-writer"
+            )
+
+    def stop(self):
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    async def _write_shard(self, rows: list):
+        started = time.perf_counter()
+        if AsyncSessionLocal is not None:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(Notification), rows)
+                await db.commit()
+        else:
+            if self.executor is None:
+                self.start()
+            await asyncio.get_running_loop().run_in_executor(self.executor, write_rows, rows)
+        self.write_time.observe(time.perf_counter() - started)
+
+    async def write(self, rows: list) -> list:
+        """Параллельно пишет шарды userId; возвращает пропущенные строки.
+
+        Пропускаются только строки с ошибкой в данных: такой шард пишется
+        построчно, чтобы одна битая строка не останавливала партицию. Сбои
+        соединения повторяются до NOTIFICATIONS_WRITE_RETRIES раз, после чего
+        поднимается WriteFailed, а незаписанные строки остаются вызывающему.
+        """
+        pending = shard_by_user(rows, settings.NOTIFICATIONS_WRITE_CONCURRENCY)
+        written = []
+        dropped = []
+        error = None
+        for attempt in range(settings.NOTIFICATIONS_WRITE_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(settings.KAFKA_CONSUMER_RETRY_BACKOFF_MS / 1000 * 2 ** (attempt - 1))
+            results = await asyncio.gather(*(self._write_shard(shard) for shard in pending), return_exceptions=True)
+            failed = []
+            for shard, result in zip(pending, results):
+                if isinstance(result, BrokenExecutor):
+                    # Процесс пула упал: следующая попытка идёт в новый пул
+                    self.stop()
+                if not isinstance(result, Exception):
+                    self.notifications += len(shard)
+                    written.extend(shard)
+                    continue
+                self.write_failures += 1
+                print(f"Error writing notifications batch: {result}")
+                if is_transient(result):
+                    error = result
+                    failed.append(shard)
+                    continue
+                rest, rest_error = await self._write_rows_separately(shard, written, dropped)
+                if rest:
+                    error = rest_error
+                    failed.append(rest)
+
+            # Повторяем только незаписанные шарды, иначе успешные задублируются
+            pending = failed
+            if not pending:
+                break
+
+        self.dropped += len(dropped)
+        if pending:
+            raise WriteFailed(error, written, dropped)
+        return dropped
+
+    async def _write_rows_separately(self, rows: list, written: list, dropped: list):
+        """Пишет строки по одной; возвращает незаписанный остаток при сбое соединения и саму ошибку"""
+        for index, row in enumerate(rows):
+            try:
+                await self._write_shard([row])
+            except Exception as e:
+                if is_transient(e):
+                    return rows[index:], e
+                print(f"Dropping notification {row['id']} for user {row['userId']}: {e}")
+                dropped.append(row)
+                continue
+            self.notifications += 1
+            written.append(row)
+        return [], None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "concurrency": settings.NOTIFICATIONS_WRITE_CONCURRENCY,
+            "notifications": self.notifications,
+            "write_failures": self.write_failures,
+            "dropped": self.dropped,
+            "write_seconds": self.write_time.snapshot()
+        }
+
+
+notification_writer = NotificationWriter()
@@ -0,0 +1,21 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_cursor(created_at: datetime, row_id: uuid.UUID) -> str:
+    """Opaque keyset cursor for the (createdAt, id) position of the last row"""
+    raw = json.dumps([created_at.isoformat(), str(row_id)])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Raises ValueError for malformed cursors"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
@@ -0,0 +1,257 @@
+import asyncio
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from database import engine
+from config import settings
+
+# Ключ advisory lock, чтобы миграцию и обслуживание партиций выполнял один инстанс
+LOCK_KEY = 420020
+
+ARCHIVE_COLUMNS = '"id", "userId", "type", "title", "message", "count", "createdAt"'
+PARTITION_BOUND = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    month = value.month - 1 + months
+    return datetime(value.year + month // 12, month % 12 + 1, 1)
+
+
+def _parse_bound(value: str) -> Optional[datetime]:
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def list_partitions(conn) -> List[Tuple[str, Optional[datetime], Optional[datetime]]]:
+    """(имя, нижняя граница, верхняя граница) партиций notifications; None для MINVALUE/MAXVALUE"""
+    rows = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'notifications'::regclass
+    """))
+    partitions = []
+    for name, bound in rows:
+        match = PARTITION_BOUND.search(bound)
+        if match:
+            partitions.append((name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+    return partitions
+
+
+def migrate_to_partitioned(conn) -> Optional[datetime]:
+    """Подключает существующую обычную таблицу как первую партицию, без копирования строк.
+
+    Возвращает верхнюю границу подключённой партиции или None, если переносить было нечего.
+    """
+    relkind = conn.scalar(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('notifications')"))
+    if relkind != 'r':
+        return None
+
+    from models import Notification
+
+    conn.execute(text('ALTER TABLE notifications RENAME TO notifications_legacy'))
+    # PRIMARY KEY (id, "createdAt") родителя создастся на партиции при ATTACH
+    conn.execute(text('ALTER TABLE notifications_legacy DROP CONSTRAINT notifications_pkey'))
+    for index in Notification.__table__.indexes:
+        conn.execute(text(f'DROP INDEX IF EXISTS "{index.name}"'))
+    conn.execute(text('UPDATE notifications_legacy SET "createdAt" = now() AT TIME ZONE \'utc\' WHERE "createdAt" IS NULL'))
+    conn.execute(text('ALTER TABLE notifications_legacy ALTER COLUMN "createdAt" SET NOT NULL'))
+
+    Notification.__table__.create(bind=conn)
+    newest = conn.scalar(text('SELECT max("createdAt") FROM notifications_legacy')) or datetime.utcnow()
+    upper = add_months(month_start(max(newest, datetime.utcnow())), 1)
+    conn.execute(text(
+        f"ALTER TABLE notifications ATTACH PARTITION notifications_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{upper.isoformat(sep=' ')}')"
+    ))
+    return upper
+
+
+def ensure_partitions(conn, now: datetime) -> int:
+    """Создаёт недостающие месячные партиции от текущего месяца на NOTIFICATIONS_PARTITIONS_AHEAD вперёд"""
+    partitions = list_partitions(conn)
+    created = 0
+    start = month_start(now)
+    for _ in range(settings.NOTIFICATIONS_PARTITIONS_AHEAD + 1):
+        upper = add_months(start, 1)
+        covered = any(
+            (lower is None or lower < upper) and (bound is None or bound > start)
+            for _, lower, bound in partitions
+        )
+        if not covered:
+            conn.execute(text(
+                f'CREATE TABLE "notifications_p{start:%Y_%m}" PARTITION OF notifications '
+                f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{upper.isoformat(sep=' ')}')"
+            ))
+            created += 1
+        start = upper
+    return created
+
+
+def archive_read(conn, cutoff: datetime) -> int:
+    """Переносит прочитанные уведомления старше cutoff в архив, пакетами по транзакции.
+
+    Пакеты идут по частичному индексу прочитанных в порядке createdAt, и каждый
+    следующий начинается с createdAt, на котором закончился предыдущий, чтобы не
+    проходить заново уже перенесённые строки.
+    """
+    archived = 0
+    after = datetime.min
+    while True:
+        with conn.begin():
+            moved, last = conn.execute(text(f"""
+                WITH moved AS (
+                    DELETE FROM notifications
+                    WHERE ("id", "createdAt") IN (
+                        SELECT "id", "createdAt" FROM notifications
+                        WHERE "isRead" AND "createdAt" >= :after AND "createdAt" < :cutoff
+                        ORDER BY "createdAt"
+                        LIMIT :batch_size
+                    )
+                    RETURNING {ARCHIVE_COLUMNS}
+                ), archived AS (
+                    INSERT INTO notifications_archive ({ARCHIVE_COLUMNS})
+                    SELECT {ARCHIVE_COLUMNS} FROM moved
+                    ON CONFLICT ("id") DO NOTHING
+                )
+                SELECT count(*), max("createdAt") FROM moved
+            """), {"after": after, "cutoff": cutoff, "batch_size": settings.NOTIFICATIONS_ARCHIVE_BATCH_SIZE}).one()
+        archived += moved
+        after = last or after
+        if moved < settings.NOTIFICATIONS_ARCHIVE_BATCH_SIZE:
+            return archived
+
+
+def drop_expired_partitions(conn, cutoff: datetime) -> int:
+    """Удаляет партиции, целиком лежащие раньше cutoff, предварительно переложив строки в архив"""
+    with conn.begin():
+        partitions = list_partitions(conn)
+
+    dropped = 0
+    for name, _, upper in partitions:
+        if upper is None or upper > cutoff:
+            continue
+        with conn.begin():
+            if settings.NOTIFICATIONS_RETENTION_ARCHIVE:
+                conn.execute(text(
+                    f'INSERT INTO notifications_archive ({ARCHIVE_COLUMNS}) '
+                    f'SELECT {ARCHIVE_COLUMNS} FROM "{name}" ON CONFLICT ("id") DO NOTHING'
+                ))
+            conn.execute(text(f'ALTER TABLE notifications DETACH PARTITION "{name}"'))
+            conn.execute(text(f'DROP TABLE "{name}"'))
+        dropped += 1
+    return dropped
+
+
+def trim_archive(conn, cutoff: datetime) -> int:
+    """Удаляет из архива уведомления старше cutoff, пакетами по транзакции"""
+    trimmed = 0
+    while True:
+        with conn.begin():
+            deleted = conn.execute(text("""
+                DELETE FROM notifications_archive
+                WHERE "id" IN (
+                    SELECT "id" FROM notifications_archive
+                    WHERE "createdAt" < :cutoff
+                    LIMIT :batch_size
+                )
+            """), {"cutoff": cutoff, "batch_size": settings.NOTIFICATIONS_ARCHIVE_BATCH_SIZE}).rowcount
+        trimmed += deleted
+        if deleted < settings.NOTIFICATIONS_ARCHIVE_BATCH_SIZE:
+            return trimmed
+
+
+def prepare_storage():
+    """Вызывается при старте: партиционирование и партиции на ближайшие месяцы"""
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+        retention_job.legacy_partition_until = migrate_to_partitioned(conn)
+        ensure_partitions(conn, datetime.utcnow())
+
+
+class RetentionJob:
+    """Фоновое обслуживание таблицы уведомлений.
+
+    Создаёт будущие партиции, переносит прочитанные уведомления старше
+    NOTIFICATIONS_ARCHIVE_AFTER_DAYS в notifications_archive, удаляет
+    партиции старше NOTIFICATIONS_RETENTION_DAYS и строки архива старше
+    NOTIFICATIONS_ARCHIVE_RETENTION_DAYS.
+    """
+
+    def __init__(self):
+        self.task = None
+        self.runs = 0
+        self.failures = 0
+        self.created_partitions = 0
+        self.archived = 0
+        self.dropped_partitions = 0
+        self.trimmed_archive = 0
+        self.last_run = None
+        # Верхняя граница партиции из старой таблицы, если её подключили при этом запуске
+        self.legacy_partition_until = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def run_once(self, now: Optional[datetime] = None):
+        now = now or datetime.utcnow()
+        with engine.connect() as conn:
+            if not conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": LOCK_KEY}):
+                # Этим сейчас занят другой инстанс
+                conn.rollback()
+                return
+            conn.commit()
+            try:
+                with conn.begin():
+                    self.created_partitions += ensure_partitions(conn, now)
+                self.archived += archive_read(conn, now - timedelta(days=settings.NOTIFICATIONS_ARCHIVE_AFTER_DAYS))
+                self.dropped_partitions += drop_expired_partitions(
+                    conn, now - timedelta(days=settings.NOTIFICATIONS_RETENTION_DAYS)
+                )
+                self.trimmed_archive += trim_archive(
+                    conn, now - timedelta(days=settings.NOTIFICATIONS_ARCHIVE_RETENTION_DAYS)
+                )
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+                conn.commit()
+        self.runs += 1
+        self.last_run = now
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(self.run_once)
+            except Exception as e:
+                self.failures += 1
+                print(f"Notifications retention failed: {e}")
+            await asyncio.sleep(settings.NOTIFICATIONS_RETENTION_INTERVAL_S)
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "created_partitions": self.created_partitions,
+            "archived": self.archived,
+            "dropped_partitions": self.dropped_partitions,
+            "trimmed_archive": self.trimmed_archive,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "legacy_partition_until": self.legacy_partition_until.isoformat() if self.legacy_partition_until else None
+        }
+
+
+retention_job = RetentionJob()
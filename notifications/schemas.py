@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import List, Optional
 from uuid import UUID
 
 class NotificationResponse(BaseModel):
@@ -9,7 +10,22 @@ class NotificationResponse(BaseModel):
     title: str
     message: str
     isRead: bool
+    count: int = 1
     createdAt: datetime
 
     class Config:
         from_attributes = True
+
+class NotificationPage(BaseModel):
+    items: List[NotificationResponse]
+    nextCursor: Optional[str] = None
+
+class UnreadCountResponse(BaseModel):
+    userId: UUID
+    unread: int
+
+class MarkReadRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=1000)
+
+class MarkReadResponse(BaseModel):
+    updated: int
@@ -1,3 +1,5 @@
+from typing import Optional
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 
@@ -6,6 +8,58 @@ class Settings(BaseSettings):
     AUTH_SERVICE_URL: str = "http://auth:8000"
     KAFKA_BOOTSTRAP_SERVERS: str = "kafka:29092"
 
+    # Outbox batches share broker requests; failed sends stay in the outbox for the relay to retry
+    KAFKA_LINGER_MS: int = 10
+    KAFKA_MAX_BATCH_SIZE: int = 65536
+    KAFKA_COMPRESSION_TYPE: Optional[str] = None  # gzip, snappy, lz4 or zstd
+
+    # Transactional outbox relay
+    OUTBOX_BATCH_SIZE: int = 500
+    OUTBOX_POLL_INTERVAL_S: float = 1
+
+    # Use create_async_engine/asyncpg instead of psycopg2 in the threadpool
+    DB_ASYNC: bool = False
+
+    # SQLAlchemy connection pool
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    # NullPool and no prepared statement cache, for PgBouncer transaction pooling
+    DB_PGBOUNCER_MODE: bool = False
+
+    # "remote" validates every token via /auth/validate, "local" checks the JWT in-process
+    AUTH_MODE: str = "remote"
+    SECRET_KEY: str = ""
+    ALGORITHM: str = "HS256"
+    AUTH_REVOCATION_CHECK: bool = False
+
+    # In-process cache of /auth/validate results
+    AUTH_CACHE_ENABLED: bool = True
+    AUTH_CACHE_TTL_SECONDS: float = 60
+    AUTH_CACHE_MAX_SIZE: int = 10000
+
+    # Shared httpx client used for inter-service calls
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30
+    HTTP_TIMEOUT: float = 5
+    HTTP_CONNECT_TIMEOUT: float = 2
+    HTTP_POOL_TIMEOUT: float = 2
+    HTTP2_ENABLED: bool = False
+
+    # Max ids per POST /auth/users:batchGet call
+    AUTH_USERS_BATCH_SIZE: int = 1000
+
+    @model_validator(mode="after")
+    def check_auth_mode(self):
+        if self.AUTH_MODE not in ("remote", "local"):
+            raise ValueError(f"AUTH_MODE must be 'remote' or 'local', got {self.AUTH_MODE!r}")
+        if self.AUTH_MODE == "local" and not self.SECRET_KEY:
+            raise ValueError("SECRET_KEY is required when AUTH_MODE=local")
+        return self
+
     class Config:
         env_file = ".env"
 
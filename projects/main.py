@@ -1,36 +1,55 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import any_, func, select, tuple_, union
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 import uuid
 import httpx
 from contextlib import asynccontextmanager
 
-from database import get_db, engine, Base
-from schemas import ProjectCreate, ProjectUpdate, ProjectResponse, ProjectMemberAdd, ProjectMemberResponse
+from database import get_db, engine, Base, ensure_indexes, pool_stats
+from schemas import ProjectCreate, ProjectUpdate, ProjectResponse, ProjectPage, ProjectMemberAdd, ProjectMemberResponse
 from models import Project, ProjectMember
-from auth_utils import get_current_user
+from auth_utils import get_current_user, token_cache
 from config import settings
 from kafka_producer import kafka_producer
+from outbox import add_event, outbox_relay
+from http_client import http_client
+from pagination import encode_cursor, decode_cursor
 
 Base.metadata.create_all(bind=engine)
+ensure_indexes()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    await http_client.start()
     await kafka_producer.start()
+    await outbox_relay.start()
     yield
     # Shutdown
+    await outbox_relay.stop()
     await kafka_producer.stop()
+    await http_client.stop()
 
 app = FastAPI(title="Projects Service", lifespan=lifespan)
 security = HTTPBearer()
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "auth_cache": token_cache.stats(),
+        "db_pool": pool_stats(),
+        "kafka_producer": kafka_producer.stats(),
+        "outbox_relay": outbox_relay.stats()
+    }
+
+
 @app.post("/projects", response_model=ProjectResponse)
 async def create_project(
     project: ProjectCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     db_project = Project(
@@ -40,16 +59,18 @@ async def create_project(
         ownerId=current_user["id"]
     )
     db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
+    await db.flush()
     
-    # Отправляем событие в Kafka
-    await kafka_producer.send_event('projects-events', {
+    # Событие для Kafka сохраняется в outbox в той же транзакции
+    add_event(db, 'projects-events', {
         'event_type': 'project_created',
         'project_id': str(db_project.id),
         'project_name': db_project.name,
         'owner_id': str(db_project.ownerId)
-    })
+    }, key=str(db_project.ownerId))
+    await db.commit()
+    await db.refresh(db_project)
+    outbox_relay.notify()
     
     return ProjectResponse(
         id=str(db_project.id),
@@ -61,33 +82,73 @@ async def create_project(
     )
 
 
-@app.get("/projects", response_model=List[ProjectResponse])
+@app.get("/projects", response_model=ProjectPage)
 async def get_projects(
-    db: Session = Depends(get_db),
+    include_member: bool = Query(False),
+    project_status: Optional[str] = Query(None, alias="status"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    projects = db.query(Project).filter(Project.ownerId == uuid.UUID(current_user["id"])).all()
+    user_id = uuid.UUID(current_user["id"])
     
-    return [
-        ProjectResponse(
-            id=str(p.id),
-            name=p.name,
-            description=p.description,
-            status=p.status,
-            ownerId=str(p.ownerId),
-            createdAt=p.createdAt
+    if include_member:
+        # Owned and member project ids come from two index scans. Passing them as an array
+        # makes Postgres fetch just those rows by primary key instead of hash-joining projects
+        visible_ids = union(
+            select(Project.id).where(Project.ownerId == user_id),
+            select(ProjectMember.projectId).where(ProjectMember.userId == user_id)
         )
-        for p in projects
-    ]
+        query = select(Project).where(Project.id == any_(func.array(visible_ids.scalar_subquery())))
+    else:
+        query = select(Project).where(Project.ownerId == user_id)
+    
+    if project_status:
+        query = query.where(Project.status == project_status)
+    
+    if cursor:
+        try:
+            last_created_at, last_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        query = query.where(tuple_(Project.createdAt, Project.id) > tuple_(last_created_at, last_id))
+    
+    # One extra row tells whether another page exists
+    query = query.order_by(Project.createdAt, Project.id).limit(limit + 1)
+    projects = (await db.scalars(query)).all()
+    
+    next_cursor = None
+    if len(projects) > limit:
+        projects = projects[:limit]
+        next_cursor = encode_cursor(projects[-1].createdAt, projects[-1].id)
+    
+    return ProjectPage(
+        items=[
+            ProjectResponse(
+                id=str(p.id),
+                name=p.name,
+                description=p.description,
+                status=p.status,
+                ownerId=str(p.ownerId),
+                createdAt=p.createdAt
+            )
+            for p in projects
+        ],
+        nextCursor=next_cursor
+    )
 
 
 @app.get("/projects/{project_id}", response_model=ProjectResponse)
 async def get_project(
     project_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    project = db.query(Project).filter(Project.id == uuid.UUID(project_id)).first()
+    project = await db.get(Project, uuid.UUID(project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -108,10 +169,10 @@ async def get_project(
 async def update_project(
     project_id: str,
     project_update: ProjectUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    project = db.query(Project).filter(Project.id == uuid.UUID(project_id)).first()
+    project = await db.get(Project, uuid.UUID(project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -131,8 +192,8 @@ async def update_project(
     if project_update.status is not None:
         project.status = project_update.status
     
-    db.commit()
-    db.refresh(project)
+    await db.commit()
+    await db.refresh(project)
     
     return ProjectResponse(
         id=str(project.id),
@@ -147,10 +208,10 @@ async def update_project(
 @app.delete("/projects/{project_id}")
 async def delete_project(
     project_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    project = db.query(Project).filter(Project.id == uuid.UUID(project_id)).first()
+    project = await db.get(Project, uuid.UUID(project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -163,8 +224,8 @@ async def delete_project(
             detail="Not authorized to delete this project"
         )
     
-    db.delete(project)
-    db.commit()
+    await db.delete(project)
+    await db.commit()
     
     return {"message": "Project deleted successfully"}
 
@@ -173,10 +234,10 @@ async def delete_project(
 async def add_project_member(
     project_id: str,
     member: ProjectMemberAdd,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    project = db.query(Project).filter(Project.id == uuid.UUID(project_id)).first()
+    project = await db.get(Project, uuid.UUID(project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -189,10 +250,12 @@ async def add_project_member(
             detail="Not authorized to add members to this project"
         )
     
-    existing_member = db.query(ProjectMember).filter(
-        ProjectMember.projectId == uuid.UUID(project_id),
-        ProjectMember.userId == uuid.UUID(member.userId)
-    ).first()
+    existing_member = await db.scalar(
+        select(ProjectMember).where(
+            ProjectMember.projectId == uuid.UUID(project_id),
+            ProjectMember.userId == uuid.UUID(member.userId)
+        )
+    )
     
     if existing_member:
         raise HTTPException(
@@ -205,16 +268,17 @@ async def add_project_member(
         userId=member.userId
     )
     db.add(db_member)
-    db.commit()
-    db.refresh(db_member)
     
-    # Отправляем событие в Kafka
-    await kafka_producer.send_event('projects-events', {
+    # Событие для Kafka сохраняется в outbox в той же транзакции
+    add_event(db, 'projects-events', {
         'event_type': 'member_added',
         'project_id': project_id,
         'project_name': project.name,
         'user_id': member.userId
-    })
+    }, key=member.userId)
+    await db.commit()
+    await db.refresh(db_member)
+    outbox_relay.notify()
     
     return ProjectMemberResponse(
         id=str(db_member.id),
@@ -227,54 +291,55 @@ async def add_project_member(
 @app.get("/projects/{project_id}/members", response_model=List[ProjectMemberResponse])
 async def get_project_members(
     project_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    project = db.query(Project).filter(Project.id == uuid.UUID(project_id)).first()
+    project = await db.get(Project, uuid.UUID(project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found"
         )
     
-    members = db.query(ProjectMember).filter(ProjectMember.projectId == uuid.UUID(project_id)).all()
+    members = (await db.scalars(
+        select(ProjectMember).where(ProjectMember.projectId == uuid.UUID(project_id))
+    )).all()
     
-    # Fetch user names from auth service
-    result = []
-    async with httpx.AsyncClient() as client:
-        for m in members:
-            user_name = None
-            try:
-                response = await client.get(
-                    f"{settings.AUTH_SERVICE_URL}/auth/users/{m.userId}"
-                )
-                if response.status_code == 200:
-                    user_data = response.json()
-                    user_name = user_data.get("name")
-            except httpx.RequestError:
-                pass
-            
-            result.append(
-                ProjectMemberResponse(
-                    id=str(m.id),
-                    projectId=str(m.projectId),
-                    userId=str(m.userId),
-                    userName=user_name,
-                    addedAt=m.addedAt
-                )
+    # Fetch user names from auth service in batches
+    user_ids = [str(m.userId) for m in members]
+    user_names = {}
+    for start in range(0, len(user_ids), settings.AUTH_USERS_BATCH_SIZE):
+        try:
+            response = await http_client.client.post(
+                f"{settings.AUTH_SERVICE_URL}/auth/users:batchGet",
+                json={"ids": user_ids[start:start + settings.AUTH_USERS_BATCH_SIZE]}
             )
+            if response.status_code == 200:
+                for user_data in response.json()["users"]:
+                    user_names[user_data["id"]] = user_data.get("name")
+        except httpx.RequestError:
+            pass
     
-    return result
+    return [
+        ProjectMemberResponse(
+            id=str(m.id),
+            projectId=str(m.projectId),
+            userId=str(m.userId),
+            userName=user_names.get(str(m.userId)),
+            addedAt=m.addedAt
+        )
+        for m in members
+    ]
 
 
 @app.delete("/projects/{project_id}/members/{user_id}")
 async def remove_project_member(
     project_id: str,
     user_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    project = db.query(Project).filter(Project.id == uuid.UUID(project_id)).first()
+    project = await db.get(Project, uuid.UUID(project_id))
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -287,10 +352,12 @@ async def remove_project_member(
             detail="Not authorized to remove members from this project"
         )
     
-    member = db.query(ProjectMember).filter(
-        ProjectMember.projectId == uuid.UUID(project_id),
-        ProjectMember.userId == uuid.UUID(user_id)
-    ).first()
+    member = await db.scalar(
+        select(ProjectMember).where(
+            ProjectMember.projectId == uuid.UUID(project_id),
+            ProjectMember.userId == uuid.UUID(user_id)
+        )
+    )
     
     if not member:
         raise HTTPException(
@@ -298,16 +365,17 @@ async def remove_project_member(
             detail="Member not found in this project"
         )
     
-    db.delete(member)
-    db.commit()
+    await db.delete(member)
     
-    # Отправляем событие в Kafka
-    await kafka_producer.send_event('projects-events', {
+    # Событие для Kafka сохраняется в outbox в той же транзакции
+    add_event(db, 'projects-events', {
         'event_type': 'member_removed',
         'project_id': project_id,
         'project_name': project.name,
         'user_id': user_id
-    })
+    }, key=user_id)
+    await db.commit()
+    outbox_relay.notify()
     
     return {"message": "Member removed successfully"}
 
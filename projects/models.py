@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import BigInteger, Column, String, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from datetime import datetime
 import uuid
 from database import Base
@@ -15,6 +15,11 @@ class Project(Base):
     ownerId = Column(UUID(as_uuid=True), nullable=False, index=True)
     createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    # Keyset pages of GET /projects are ordered by (createdAt, id)
+    __table_args__ = (
+        Index("ix_projects_owner_created_id", "ownerId", "createdAt", "id"),
+    )
+
 
 class ProjectMember(Base):
     __tablename__ = "project_members"
@@ -23,3 +28,20 @@ class ProjectMember(Base):
     projectId = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
     userId = Column(UUID(as_uuid=True), nullable=False, index=True)
     addedAt = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Covers the membership lookup of GET /projects?include_member=true with an index-only scan
+    __table_args__ = (
+        Index("ix_project_members_user_project", "userId", "projectId"),
+    )
+
+
+class OutboxEvent(Base):
+    """Event written in the same transaction as the change it describes"""
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    topic = Column(String, nullable=False)
+    # Kafka message key: events addressed to one user stay on one partition
+    key = Column(String, nullable=True)
+    payload = Column(JSONB, nullable=False)
+    createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,105 @@
+import asyncio
+from typing import List, Optional
+
+from sqlalchemy import delete, func, select
+
+from config import settings
+from database import session_scope
+from kafka_producer import kafka_producer
+from models import OutboxEvent
+
+# pg_try_advisory_xact_lock key held by the relay pass that is publishing
+LOCK_KEY = 420012
+
+
+def add_event(db, topic: str, event: dict, key: Optional[str] = None):
+    """Stage an event in the caller's transaction; the relay publishes it after commit"""
+    db.add(OutboxEvent(topic=topic, key=key, payload=event))
+
+
+class InMemoryBroker:
+    """Stand-in for KafkaProducer that records published messages"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def send_messages_and_wait(self, messages: List[tuple]):
+        self.messages.extend(messages)
+
+
+class OutboxRelay:
+    """Publishes committed outbox rows in id order and deletes them once acked.
+
+    Every instance runs a relay, but a pass only publishes while it holds a
+    transaction-level advisory lock; passes of the other instances find the
+    lock taken and skip. Two relays draining the table concurrently would
+    publish events of the same key out of order.
+    """
+
+    def __init__(self, publisher=None, session_factory=session_scope):
+        self.publisher = publisher or kafka_producer
+        self.session_factory = session_factory
+        self.task = None
+        self.wakeup = asyncio.Event()
+        self.published = 0
+        self.failures = 0
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def notify(self):
+        """Wake the relay right after a commit instead of waiting for the next poll"""
+        self.wakeup.set()
+
+    async def relay_once(self) -> int:
+        async with self.session_factory() as db:
+            if not await db.scalar(select(func.pg_try_advisory_xact_lock(LOCK_KEY))):
+                return 0
+            events = (await db.scalars(
+                select(OutboxEvent)
+                .order_by(OutboxEvent.id)
+                .limit(settings.OUTBOX_BATCH_SIZE)
+            )).all()
+            if not events:
+                return 0
+
+            await self.publisher.send_messages_and_wait(
+                [(e.topic, e.key, e.payload) for e in events]
+            )
+            await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([e.id for e in events])))
+            await db.commit()
+
+        self.published += len(events)
+        return len(events)
+
+    async def _run(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                published = await self.relay_once()
+            except Exception as e:
+                # Rows stay in the outbox and are retried on the next pass
+                self.failures += 1
+                print(f"Outbox relay failed: {e}")
+                published = 0
+
+            if published < settings.OUTBOX_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=settings.OUTBOX_POLL_INTERVAL_S)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stats(self) -> dict:
+        return {"published": self.published, "failures": self.failures}
+
+
+outbox_relay = OutboxRelay()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -28,6 +28,11 @@ class ProjectResponse(ProjectBase):
         from_attributes = True
 
 
+class ProjectPage(BaseModel):
+    items: List[ProjectResponse]
+    nextCursor: Optional[str] = None
+
+
 class ProjectMemberAdd(BaseModel):
     userId: str
 
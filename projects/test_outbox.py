@@ -0,0 +1,99 @@
+"""OutboxRelay against InMemoryBroker; needs the Postgres from DATABASE_URL"""
+import asyncio
+
+import pytest
+from sqlalchemy import exc, func, select, text
+
+from database import Base, SessionLocal, async_engine, engine
+from models import OutboxEvent
+from outbox import LOCK_KEY, InMemoryBroker, OutboxRelay
+
+try:
+    with engine.connect():
+        pass
+except exc.OperationalError:
+    pytest.skip("Postgres from DATABASE_URL is not reachable", allow_module_level=True)
+
+
+class FailingBroker:
+    async def send_messages_and_wait(self, messages):
+        raise ConnectionError("broker unavailable")
+
+
+@pytest.fixture(autouse=True)
+def outbox():
+    Base.metadata.create_all(bind=engine, tables=[OutboxEvent.__table__])
+    with engine.begin() as conn:
+        conn.execute(OutboxEvent.__table__.delete())
+    yield
+    with engine.begin() as conn:
+        conn.execute(OutboxEvent.__table__.delete())
+
+
+def stage(*keys):
+    with SessionLocal() as db:
+        db.add_all(OutboxEvent(topic="projects-events", key=key, payload={"seq": seq}) for seq, key in enumerate(keys))
+        db.commit()
+
+
+def relay_once(relay) -> int:
+    """One relay pass on its own event loop; asyncpg connections must not outlive the loop"""
+    async def run():
+        try:
+            return await relay.relay_once()
+        finally:
+            if async_engine is not None:
+                await async_engine.dispose()
+    return asyncio.run(run())
+
+
+def outbox_size() -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(OutboxEvent))
+
+
+def test_successful_send_publishes_in_order_and_deletes_rows():
+    stage("a", "b", "a")
+    broker = InMemoryBroker()
+    relay = OutboxRelay(publisher=broker)
+
+    assert relay_once(relay) == 3
+
+    assert broker.messages == [
+        ("projects-events", "a", {"seq": 0}),
+        ("projects-events", "b", {"seq": 1}),
+        ("projects-events", "a", {"seq": 2})
+    ]
+    assert outbox_size() == 0
+    assert relay_once(relay) == 0
+    assert len(broker.messages) == 3
+
+
+def test_failed_send_keeps_rows_for_the_next_pass():
+    stage("a", "b")
+    relay = OutboxRelay(publisher=FailingBroker())
+
+    with pytest.raises(ConnectionError):
+        relay_once(relay)
+    assert outbox_size() == 2
+    assert relay.published == 0
+
+    broker = InMemoryBroker()
+    relay.publisher = broker
+    assert relay_once(relay) == 2
+    assert [payload["seq"] for _, _, payload in broker.messages] == [0, 1]
+    assert outbox_size() == 0
+
+
+def test_pass_is_skipped_while_another_relay_holds_the_lock():
+    stage("a")
+    broker = InMemoryBroker()
+    relay = OutboxRelay(publisher=broker)
+
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+        assert relay_once(relay) == 0
+        assert broker.messages == []
+
+    assert relay_once(relay) == 1
+    assert outbox_size() == 0
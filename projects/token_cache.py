@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Tuple
+
+from jose import JWTError, jwt
+
+
+class TokenCache:
+    """Bounded LRU cache of validated tokens.
+
+    Entries are keyed by a SHA-256 digest of the token and expire at the
+    token's own ``exp`` claim or after ``ttl_seconds``, whichever comes
+    first. Concurrent misses for one token share a single upstream call.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _expires_at(self, token: str) -> float:
+        expires_at = time.time() + self.ttl_seconds
+        try:
+            exp = jwt.get_unverified_claims(token).get("exp")
+        except JWTError:
+            exp = None
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        return expires_at
+
+    def _get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return user
+
+    def _put(self, key: str, token: str, user: dict):
+        self._entries[key] = (self._expires_at(token), user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(self, token: str, loader: Callable[[str], Awaitable[dict]]) -> dict:
+        key = self._key(token)
+
+        user = self._get(key)
+        if user is not None:
+            self.hits += 1
+            return user
+        self.misses += 1
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            # shield so that a cancelled waiter does not cancel the shared call
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            user = await loader(token)
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(user)
+            self._put(key, token, user)
+            return user
+        finally:
+            del self._inflight[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced
+        }
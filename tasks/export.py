@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Dict, List
+
+from sqlalchemy import select
+
+from database import session_scope
+from models import Task, TaskComment
+
+TASK_FIELDS = [
+    "id", "projectId", "title", "description", "status", "priority",
+    "assigneeId", "createdBy", "startDate", "dueDate", "createdAt"
+]
+
+
+def _value(value):
+    if value is None:
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value
+    return str(value)
+
+
+def task_to_dict(task: Task) -> dict:
+    return {field: _value(getattr(task, field)) for field in TASK_FIELDS}
+
+
+def comment_to_dict(comment: TaskComment) -> dict:
+    return {
+        "id": str(comment.id),
+        "authorId": str(comment.authorId),
+        "content": comment.content,
+        "createdAt": comment.createdAt.isoformat()
+    }
+
+
+async def _load_comments(db, task_ids: List) -> Dict:
+    # One query per partition instead of one per task
+    comments = {}
+    result = await db.scalars(
+        select(TaskComment)
+        .where(TaskComment.taskId.in_(task_ids))
+        .order_by(TaskComment.taskId, TaskComment.createdAt)
+    )
+    for comment in result:
+        comments.setdefault(comment.taskId, []).append(comment_to_dict(comment))
+    return comments
+
+
+async def stream_task_export(query, export_format: str, include_comments: bool) -> AsyncIterator[str]:
+    """Yield NDJSON lines or CSV rows partition by partition from a server-side cursor.
+
+    Uses its own session so the cursor stays open for the whole response.
+    """
+    async with session_scope() as db:
+        result = await db.stream_scalars(query)
+
+        columns = TASK_FIELDS + (["comments"] if include_comments else [])
+        if export_format == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(columns)
+            yield buffer.getvalue()
+
+        async for tasks in result.partitions():
+            comments = {}
+            if include_comments:
+                comments = await _load_comments(db, [t.id for t in tasks])
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer) if export_format == "csv" else None
+            for task in tasks:
+                row = task_to_dict(task)
+                if include_comments:
+                    row["comments"] = comments.get(task.id, [])
+
+                if writer is not None:
+                    if include_comments:
+                        row["comments"] = json.dumps(row["comments"], ensure_ascii=False)
+                    writer.writerow([row[column] for column in columns])
+                else:
+                    buffer.write(json.dumps(row, ensure_ascii=False))
+                    buffer.write("\n")
+            yield buffer.getvalue()
@@ -1,26 +1,40 @@
 import json
 import asyncio
+import time
 from aiokafka import AIOKafkaProducer
 from aiokafka.errors import KafkaConnectionError
 from config import settings
+from metrics import Histogram, LATENCY_BUCKETS
+
+BATCH_SIZE_BUCKETS = (1, 5, 10, 50, 100, 250, 500, 1000)
+
 
 class KafkaProducer:
+    """Delivers outbox rows; retries are left to the relay, which keeps undelivered rows"""
+
     def __init__(self):
         self.producer = None
-    
+        self.send_latency = Histogram(LATENCY_BUCKETS)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.send_failures = 0
+
     async def start(self):
         max_retries = 30
         retry_delay = 2
-        
+
         for attempt in range(max_retries):
             try:
                 self.producer = AIOKafkaProducer(
                     bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
-                    value_serializer=lambda v: json.dumps(v).encode('utf-8')
+                    value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+                    key_serializer=lambda k: k.encode('utf-8') if k is not None else None,
+                    linger_ms=settings.KAFKA_LINGER_MS,
+                    max_batch_size=settings.KAFKA_MAX_BATCH_SIZE,
+                    compression_type=settings.KAFKA_COMPRESSION_TYPE
                 )
                 await self.producer.start()
                 print(f"Successfully connected to Kafka at {settings.KAFKA_BOOTSTRAP_SERVERS}")
-                return
+                break
             except KafkaConnectionError:
                 if attempt < max_retries - 1:
                     print(f"Kafka connection attempt {attempt + 1}/{max_retries} failed, retrying in {retry_delay}s...")
@@ -28,13 +42,34 @@ class KafkaProducer:
                 else:
                     print("Failed to connect to Kafka after all retries")
                     raise
-    
+
     async def stop(self):
         if self.producer:
             await self.producer.stop()
-    
-    async def send_event(self, topic: str, event: dict):
-        if self.producer:
-            await self.producer.send_and_wait(topic, event)
+
+    async def send_messages_and_wait(self, messages: list):
+        """Enqueue (topic, key, event) messages so they share broker batches, then wait for delivery"""
+        if not self.producer:
+            raise RuntimeError("Kafka producer is not started")
+        if not messages:
+            return
+        started = time.perf_counter()
+        self.batch_sizes.observe(len(messages))
+        try:
+            # Enqueue in order so events with one key keep their order, then await acks
+            futures = [await self.producer.send(topic, event, key=key) for topic, key, event in messages]
+            await asyncio.gather(*futures)
+        except Exception:
+            self.send_failures += 1
+            raise
+        finally:
+            self.send_latency.observe(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        return {
+            "send_seconds": self.send_latency.snapshot(),
+            "batch_sizes": self.batch_sizes.snapshot(),
+            "send_failures": self.send_failures
+        }
 
 kafka_producer = KafkaProducer()
@@ -1,34 +1,71 @@
 from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
+from datetime import date, datetime
+from collections import Counter
 import uuid
 from contextlib import asynccontextmanager
 
-from database import get_db, engine, Base
-from schemas import TaskCreate, TaskUpdate, TaskResponse, TaskCommentCreate, TaskCommentResponse
-from models import Task, TaskComment
-from auth_utils import get_current_user
+from database import get_db, engine, Base, ensure_columns, ensure_indexes, pool_stats
+from schemas import (
+    TaskCreate, TaskUpdate, TaskResponse, TaskPage, TaskCommentCreate, TaskCommentResponse,
+    TaskBulkCreate, TaskBulkUpdate, TaskBulkError, TaskBulkResponse,
+    TaskSummary, TaskSummaryBatchGet, TaskSummaryBatchResponse
+)
+from models import DeletedTask, Task, TaskComment
+from auth_utils import get_current_user, token_cache
 from kafka_producer import kafka_producer
+from outbox import add_event, outbox_relay
+from pagination import encode_cursor, decode_cursor
+from export import stream_task_export
+from snapshots import DATASETS, snapshot_job, snapshot_store, stream_arrow
+from task_summary import apply_counter_deltas, counter_key, ensure_task_counters, load_summaries
+from config import settings
+from http_client import http_client
 
 Base.metadata.create_all(bind=engine)
+ensure_columns()
+ensure_indexes()
+ensure_task_counters()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    await http_client.start()
     await kafka_producer.start()
+    await outbox_relay.start()
+    if settings.SNAPSHOT_ENABLED:
+        await snapshot_job.start()
     yield
     # Shutdown
+    await snapshot_job.stop()
+    await outbox_relay.stop()
     await kafka_producer.stop()
+    await http_client.stop()
 
 app = FastAPI(title="Tasks Service", lifespan=lifespan)
 security = HTTPBearer()
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "auth_cache": token_cache.stats(),
+        "db_pool": pool_stats(),
+        "kafka_producer": kafka_producer.stats(),
+        "outbox_relay": outbox_relay.stats(),
+        "snapshots": snapshot_job.stats()
+    }
+
+
 @app.post("/tasks", response_model=TaskResponse)
 async def create_task(
     task: TaskCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     db_task = Task(
@@ -43,17 +80,15 @@ async def create_task(
         dueDate=task.dueDate
     )
     db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
+    await db.flush()
     
-    # Отправляем событие в Kafka
-    if db_task.assigneeId:
-        await kafka_producer.send_event('tasks-events', {
-            'event_type': 'task_created',
-            'task_id': str(db_task.id),
-            'task_title': db_task.title,
-            'assignee_id': str(db_task.assigneeId)
-        })
+    await apply_counter_deltas(db, Counter({counter_key(db_task): 1}))
+    
+    # Событие для Kafka сохраняется в outbox в той же транзакции
+    add_event(db, 'tasks-events', task_event('task_created', db_task), key=task_event_key(db_task))
+    await db.commit()
+    await db.refresh(db_task)
+    outbox_relay.notify()
     
     return TaskResponse(
         id=str(db_task.id),
@@ -70,44 +105,205 @@ async def create_task(
     )
 
 
-@app.get("/tasks", response_model=List[TaskResponse])
+@app.get("/tasks", response_model=TaskPage)
 async def get_tasks(
     project: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    task_status: Optional[str] = Query(None, alias="status"),
+    priority: Optional[str] = Query(None),
+    assignee: Optional[str] = Query(None),
+    due_from: Optional[datetime] = Query(None),
+    due_to: Optional[datetime] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    query = db.query(Task)
+    try:
+        project_id = uuid.UUID(project) if project else None
+        assignee_id = uuid.UUID(assignee) if assignee else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid project or assignee ID format"
+        )
+    query = select(Task)
     
-    if project:
-        query = query.filter(Task.projectId == uuid.UUID(project))
+    if project_id:
+        query = query.where(Task.projectId == project_id)
+    if task_status:
+        query = query.where(Task.status == task_status)
+    if priority:
+        query = query.where(Task.priority == priority)
+    if assignee_id:
+        query = query.where(Task.assigneeId == assignee_id)
+    if due_from:
+        query = query.where(Task.dueDate >= due_from)
+    if due_to:
+        query = query.where(Task.dueDate < due_to)
     
-    tasks = query.all()
+    if cursor:
+        try:
+            last_created_at, last_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        query = query.where(tuple_(Task.createdAt, Task.id) > tuple_(last_created_at, last_id))
     
-    return [
-        TaskResponse(
-            id=str(t.id),
-            projectId=str(t.projectId),
-            title=t.title,
-            description=t.description,
-            status=t.status,
-            priority=t.priority,
-            assigneeId=str(t.assigneeId) if t.assigneeId else None,
-            createdBy=str(t.createdBy),
-            startDate=t.startDate,
-            dueDate=t.dueDate,
-            createdAt=t.createdAt
+    # One extra row tells whether another page exists
+    query = query.order_by(Task.createdAt, Task.id).limit(limit + 1)
+    tasks = (await db.scalars(query)).all()
+    
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_cursor(tasks[-1].createdAt, tasks[-1].id)
+    
+    return TaskPage(
+        items=[
+            TaskResponse(
+                id=str(t.id),
+                projectId=str(t.projectId),
+                title=t.title,
+                description=t.description,
+                status=t.status,
+                priority=t.priority,
+                assigneeId=str(t.assigneeId) if t.assigneeId else None,
+                createdBy=str(t.createdBy),
+                startDate=t.startDate,
+                dueDate=t.dueDate,
+                createdAt=t.createdAt
+            )
+            for t in tasks
+        ],
+        nextCursor=next_cursor
+    )
+
+
+@app.get("/tasks/export")
+async def export_tasks(
+    project: Optional[str] = Query(None),
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    include_comments: bool = Query(False),
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream tasks row by row without materializing the whole result"""
+    query = select(Task).order_by(Task.createdAt, Task.id).execution_options(
+        yield_per=settings.TASKS_EXPORT_BATCH_SIZE
+    )
+    if project:
+        try:
+            project_id = uuid.UUID(project)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid project ID format"
+            )
+        query = query.where(Task.projectId == project_id)
+    
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_task_export(query, export_format, include_comments),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="tasks.{export_format}"'}
+    )
+
+
+@app.get("/tasks/snapshots")
+async def get_snapshots(current_user: dict = Depends(get_current_user)):
+    """Datasets of the local snapshots with their watermarks and partitions"""
+    return await run_in_threadpool(snapshot_store.summary)
+
+
+@app.get("/tasks/snapshots/{dataset}")
+async def read_snapshot(
+    dataset: str,
+    project: Optional[str] = Query(None),
+    since: Optional[date] = Query(None),
+    until: Optional[date] = Query(None),
+    columns: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Current rows of a snapshot dataset as an Arrow IPC stream, read without touching the database.
+
+    since and until select by creation date and skip whole monthly partitions.
+    """
+    if dataset not in DATASETS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Snapshot dataset not found"
+        )
+    schema = DATASETS[dataset].schema
+    selected = columns.split(",") if columns else None
+    if selected and not set(selected) <= set(schema.names):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown columns; available: {', '.join(schema.names)}"
+        )
+    if project is not None:
+        try:
+            project = str(uuid.UUID(project))
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid project ID format"
+            )
+    if (project is not None and "projectId" not in schema.names) or ((since or until) and not DATASETS[dataset].partitioned):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Filters are not supported for this dataset"
         )
-        for t in tasks
-    ]
+
+    table = await run_in_threadpool(snapshot_store.read, dataset, since, until, project, selected)
+    return StreamingResponse(
+        stream_arrow(table),
+        media_type="application/vnd.apache.arrow.stream",
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.arrows"'}
+    )
+
+
+@app.get("/tasks/summary", response_model=TaskSummary)
+async def get_task_summary(
+    project: str = Query(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Task counts by status and priority plus overdue tasks for one project"""
+    try:
+        project_id = uuid.UUID(project)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid project ID format"
+        )
+    return (await load_summaries(db, [project_id]))[0]
+
+
+@app.post("/tasks/summary:batchGet", response_model=TaskSummaryBatchResponse)
+async def batch_get_task_summaries(
+    request: TaskSummaryBatchGet,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Summaries for many projects with the same two queries as a single one"""
+    try:
+        project_ids = [uuid.UUID(project_id) for project_id in request.projectIds]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid project ID format"
+        )
+    return TaskSummaryBatchResponse(items=await load_summaries(db, project_ids))
 
 
 @app.get("/tasks/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    task = db.query(Task).filter(Task.id == uuid.UUID(task_id)).first()
+    task = await db.get(Task, uuid.UUID(task_id))
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -133,15 +329,18 @@ async def get_task(
 async def update_task(
     task_id: str,
     task_update: TaskUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    task = db.query(Task).filter(Task.id == uuid.UUID(task_id)).first()
+    # Row lock keeps concurrent status changes from being counted twice in task_counters
+    task = await db.get(Task, uuid.UUID(task_id), with_for_update=True)
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task not found"
         )
+    counted_as = counter_key(task)
+    previous_assignee = task.assigneeId
     
     if task_update.title is not None:
         task.title = task_update.title
@@ -158,17 +357,18 @@ async def update_task(
     if task_update.dueDate is not None:
         task.dueDate = task_update.dueDate
     
-    db.commit()
-    db.refresh(task)
+    deltas = Counter()
+    deltas[counted_as] -= 1
+    deltas[counter_key(task)] += 1
+    await apply_counter_deltas(db, deltas)
     
-    # Отправляем событие в Kafka при обновлении
-    if task.assigneeId:
-        await kafka_producer.send_event('tasks-events', {
-            'event_type': 'task_updated',
-            'task_id': str(task.id),
-            'task_title': task.title,
-            'assignee_id': str(task.assigneeId)
-        })
+    # Событие для Kafka сохраняется в outbox в той же транзакции
+    add_event(db, 'tasks-events', task_event(
+        'task_updated', task, previous_status=counted_as[1], previous_assignee_id=previous_assignee
+    ), key=task_event_key(task))
+    await db.commit()
+    await db.refresh(task)
+    outbox_relay.notify()
     
     return TaskResponse(
         id=str(task.id),
@@ -185,21 +385,204 @@ async def update_task(
     )
 
 
+def task_event(event_type: str, task: Task, previous_status: Optional[str] = None, previous_assignee_id=None) -> dict:
+    """tasks-events payload: notifications read the title and assignee, analytics the status fields"""
+    event = {
+        'event_type': event_type,
+        'task_id': str(task.id),
+        'task_title': task.title,
+        'assignee_id': str(task.assigneeId) if task.assigneeId else None,
+        'project_id': str(task.projectId),
+        'status': task.status,
+        'due_date': task.dueDate.isoformat() if task.dueDate else None,
+        'created_at': task.createdAt.isoformat(),
+        'occurred_at': datetime.utcnow().isoformat()
+    }
+    if event_type == 'task_updated':
+        event['previous_status'] = previous_status
+        event['previous_assignee_id'] = str(previous_assignee_id) if previous_assignee_id else None
+    return event
+
+
+def task_event_key(task: Task) -> str:
+    # Уведомления одного пользователя идут по порядку; неназначенные задачи нужны только аналитике
+    return str(task.assigneeId or task.projectId)
+
+
+def task_to_response(task: Task) -> TaskResponse:
+    return TaskResponse(
+        id=str(task.id),
+        projectId=str(task.projectId),
+        title=task.title,
+        description=task.description,
+        status=task.status,
+        priority=task.priority,
+        assigneeId=str(task.assigneeId) if task.assigneeId else None,
+        createdBy=str(task.createdBy),
+        startDate=task.startDate,
+        dueDate=task.dueDate,
+        createdAt=task.createdAt
+    )
+
+
+def check_bulk_errors(errors: List[TaskBulkError], partial: bool):
+    if errors and not partial:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=[e.model_dump() for e in errors]
+        )
+
+
+def check_bulk_size(count: int):
+    if count > settings.TASKS_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.TASKS_BULK_MAX_ITEMS} tasks per request"
+        )
+
+
+@app.post("/tasks:bulk", response_model=TaskBulkResponse)
+async def bulk_create_tasks(
+    request: TaskBulkCreate,
+    partial: bool = Query(False),
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Insert many tasks with one multi-row INSERT ... RETURNING.
+
+    With partial=true invalid items are reported in errors and the rest
+    are still created; otherwise any invalid item rejects the request.
+    """
+    check_bulk_size(len(request.items))
+    
+    rows = []
+    errors = []
+    created_at = datetime.utcnow()
+    for index, item in enumerate(request.items):
+        try:
+            project_id = uuid.UUID(item.projectId)
+            assignee_id = uuid.UUID(item.assigneeId) if item.assigneeId else None
+        except ValueError:
+            errors.append(TaskBulkError(index=index, detail="Invalid projectId or assigneeId"))
+            continue
+        rows.append({
+            "id": uuid.uuid4(),
+            "projectId": project_id,
+            "title": item.title,
+            "description": item.description,
+            "status": item.status,
+            "priority": item.priority,
+            "assigneeId": assignee_id,
+            "createdBy": uuid.UUID(current_user["id"]),
+            "startDate": item.startDate,
+            "dueDate": item.dueDate,
+            "createdAt": created_at
+        })
+    check_bulk_errors(errors, partial)
+    
+    tasks = []
+    if rows:
+        tasks = (await db.scalars(
+            insert(Task).returning(Task, sort_by_parameter_order=True), rows
+        )).all()
+        
+        await apply_counter_deltas(db, Counter(counter_key(t) for t in tasks))
+        
+        # События для Kafka сохраняются в outbox в той же транзакции
+        for t in tasks:
+            add_event(db, 'tasks-events', task_event('task_created', t), key=task_event_key(t))
+        await db.commit()
+        outbox_relay.notify()
+    
+    return TaskBulkResponse(items=[task_to_response(t) for t in tasks], errors=errors)
+
+
+@app.patch("/tasks:bulk", response_model=TaskBulkResponse)
+async def bulk_update_tasks(
+    request: TaskBulkUpdate,
+    partial: bool = Query(False),
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Update many tasks in one transaction.
+
+    Targets are loaded with a single IN query and flushed together, so the
+    ORM groups the UPDATEs into executemany batches.
+    """
+    check_bulk_size(len(request.items))
+    
+    errors = []
+    changes = []
+    for index, item in enumerate(request.items):
+        try:
+            task_id = uuid.UUID(item.id)
+            if item.assigneeId is not None:
+                uuid.UUID(item.assigneeId)
+        except ValueError:
+            errors.append(TaskBulkError(index=index, detail="Invalid id or assigneeId"))
+            continue
+        changes.append((index, task_id, item))
+    
+    tasks_by_id = {}
+    if changes:
+        tasks_by_id = {
+            t.id: t for t in (await db.scalars(
+                select(Task).where(Task.id.in_({task_id for _, task_id, _ in changes})).with_for_update()
+            )).all()
+        }
+    counted_as = {t.id: counter_key(t) for t in tasks_by_id.values()}
+    previous_assignees = {t.id: t.assigneeId for t in tasks_by_id.values()}
+    
+    updated = {}
+    for index, task_id, item in changes:
+        task = tasks_by_id.get(task_id)
+        if task is None:
+            errors.append(TaskBulkError(index=index, detail="Task not found"))
+            continue
+        for field, value in item.model_dump(exclude={"id"}, exclude_none=True).items():
+            setattr(task, field, value)
+        updated[task.id] = task
+    errors.sort(key=lambda e: e.index)
+    check_bulk_errors(errors, partial)
+    
+    if updated:
+        deltas = Counter()
+        for t in updated.values():
+            deltas[counted_as[t.id]] -= 1
+            deltas[counter_key(t)] += 1
+        await apply_counter_deltas(db, deltas)
+        
+        # События для Kafka сохраняются в outbox в той же транзакции
+        for t in updated.values():
+            add_event(db, 'tasks-events', task_event(
+                'task_updated', t, previous_status=counted_as[t.id][1], previous_assignee_id=previous_assignees[t.id]
+            ), key=task_event_key(t))
+        await db.commit()
+        outbox_relay.notify()
+    
+    return TaskBulkResponse(items=[task_to_response(t) for t in updated.values()], errors=errors)
+
+
 @app.delete("/tasks/{task_id}")
 async def delete_task(
     task_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    task = db.query(Task).filter(Task.id == uuid.UUID(task_id)).first()
+    task = await db.get(Task, uuid.UUID(task_id), with_for_update=True)
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task not found"
         )
     
-    db.delete(task)
-    db.commit()
+    await db.delete(task)
+    # Tombstone for the snapshots, which only see rows that still exist
+    db.add(DeletedTask(id=task.id))
+    await apply_counter_deltas(db, Counter({counter_key(task): -1}))
+    add_event(db, 'tasks-events', task_event('task_deleted', task), key=task_event_key(task))
+    await db.commit()
+    outbox_relay.notify()
     
     return {"message": "Task deleted successfully"}
 
@@ -207,17 +590,19 @@ async def delete_task(
 @app.get("/tasks/{task_id}/comments", response_model=List[TaskCommentResponse])
 async def get_task_comments(
     task_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    task = db.query(Task).filter(Task.id == uuid.UUID(task_id)).first()
+    task = await db.get(Task, uuid.UUID(task_id))
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task not found"
         )
     
-    comments = db.query(TaskComment).filter(TaskComment.taskId == uuid.UUID(task_id)).all()
+    comments = (await db.scalars(
+        select(TaskComment).where(TaskComment.taskId == uuid.UUID(task_id))
+    )).all()
     
     return [
         TaskCommentResponse(
@@ -235,10 +620,10 @@ async def get_task_comments(
 async def add_task_comment(
     task_id: str,
     comment: TaskCommentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    task = db.query(Task).filter(Task.id == uuid.UUID(task_id)).first()
+    task = await db.get(Task, uuid.UUID(task_id))
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -251,17 +636,18 @@ async def add_task_comment(
         content=comment.content
     )
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
     
-    # Отправляем событие в Kafka
+    # Событие для Kafka сохраняется в outbox в той же транзакции
     if task.assigneeId:
-        await kafka_producer.send_event('tasks-events', {
+        add_event(db, 'tasks-events', {
             'event_type': 'comment_added',
             'task_id': str(task.id),
             'task_title': task.title,
             'task_assignee_id': str(task.assigneeId)
-        })
+        }, key=str(task.assigneeId))
+    await db.commit()
+    await db.refresh(db_comment)
+    outbox_relay.notify()
     
     return TaskCommentResponse(
         id=str(db_comment.id),
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import BigInteger, Column, String, DateTime, ForeignKey, Integer, Index, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from datetime import datetime
 import uuid
 from database import Base
@@ -19,6 +19,24 @@ class Task(Base):
     startDate = Column(DateTime, nullable=True)
     dueDate = Column(DateTime, nullable=True)
     createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Watermark of the incremental snapshots; existing rows get the time the column was added
+    updatedAt = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False,
+        server_default=text("timezone('utc', now())")
+    )
+
+    # Keyset pagination of GET /tasks walks (createdAt, id) within each filter
+    __table_args__ = (
+        Index("ix_tasks_created_id", "createdAt", "id"),
+        Index("ix_tasks_project_created_id", "projectId", "createdAt", "id"),
+        Index("ix_tasks_project_status_created_id", "projectId", "status", "createdAt", "id"),
+        Index("ix_tasks_project_priority_created_id", "projectId", "priority", "createdAt", "id"),
+        Index("ix_tasks_assignee_created_id", "assigneeId", "createdAt", "id"),
+        # Index-only scans for GET /tasks/summary
+        Index("ix_tasks_project_status_priority", "projectId", "status", "priority"),
+        Index("ix_tasks_project_due_status", "projectId", "dueDate", "status"),
+        Index("ix_tasks_updated", "updatedAt"),
+    )
 
 
 class TaskComment(Base):
@@ -29,3 +47,38 @@ class TaskComment(Base):
     authorId = Column(UUID(as_uuid=True), nullable=False, index=True)
     content = Column(String, nullable=False)
     createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Comments are never edited, so createdAt is the watermark of the snapshots
+    __table_args__ = (
+        Index("ix_task_comments_created", "createdAt"),
+    )
+
+
+class DeletedTask(Base):
+    """Tombstone of a deleted task, so the snapshots can drop it and its comments"""
+    __tablename__ = "deleted_tasks"
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    deletedAt = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class TaskCounter(Base):
+    """Task count per (project, status, priority), kept in step with tasks by the write endpoints"""
+    __tablename__ = "task_counters"
+
+    projectId = Column(UUID(as_uuid=True), primary_key=True)
+    status = Column(String, primary_key=True)
+    priority = Column(String, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class OutboxEvent(Base):
+    """Event written in the same transaction as the change it describes"""
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    topic = Column(String, nullable=False)
+    # Kafka message key: events addressed to one user stay on one partition
+    key = Column(String, nullable=True)
+    payload = Column(JSONB, nullable=False)
+    createdAt = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -37,6 +37,49 @@ class TaskResponse(TaskBase):
         from_attributes = True
 
 
+class TaskPage(BaseModel):
+    items: List[TaskResponse]
+    nextCursor: Optional[str] = None
+
+
+class TaskBulkCreate(BaseModel):
+    items: List[TaskCreate] = Field(..., min_length=1)
+
+
+class TaskBulkUpdateItem(TaskUpdate):
+    id: str
+
+
+class TaskBulkUpdate(BaseModel):
+    items: List[TaskBulkUpdateItem] = Field(..., min_length=1)
+
+
+class TaskBulkError(BaseModel):
+    index: int
+    detail: str
+
+
+class TaskBulkResponse(BaseModel):
+    items: List[TaskResponse]
+    errors: List[TaskBulkError] = []
+
+
+class TaskSummary(BaseModel):
+    projectId: str
+    total: int
+    byStatus: Dict[str, int]
+    byPriority: Dict[str, int]
+    overdue: int
+
+
+class TaskSummaryBatchGet(BaseModel):
+    projectIds: List[str] = Field(..., min_length=1, max_length=1000)
+
+
+class TaskSummaryBatchResponse(BaseModel):
+    items: List[TaskSummary]
+
+
 class TaskCommentCreate(BaseModel):
     content: str = Field(..., min_length=1)
 
@@ -0,0 +1,350 @@
+import asyncio
+import io
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import String, select
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from database import engine
+from models import DeletedTask, Task, TaskComment
+
+MANIFEST = "manifest.json"
+
+# query selects the columns of schema in order; rows newer than the watermark column are exported
+Dataset = namedtuple("Dataset", ["schema", "query", "watermark", "task_id", "partitioned"])
+
+
+def _as_text(column):
+    # Cast in SQL: psycopg2 then returns str, with no uuid.UUID object per value
+    return column.cast(String).label(column.key)
+
+
+DATASETS = {
+    "tasks": Dataset(
+        schema=pa.schema([
+            ("id", pa.string()),
+            ("projectId", pa.string()),
+            ("title", pa.string()),
+            ("description", pa.string()),
+            ("status", pa.string()),
+            ("priority", pa.string()),
+            ("assigneeId", pa.string()),
+            ("createdBy", pa.string()),
+            ("startDate", pa.timestamp("us")),
+            ("dueDate", pa.timestamp("us")),
+            ("createdAt", pa.timestamp("us")),
+            ("updatedAt", pa.timestamp("us"))
+        ]),
+        query=select(
+            _as_text(Task.id), _as_text(Task.projectId), Task.title, Task.description, Task.status,
+            Task.priority, _as_text(Task.assigneeId), _as_text(Task.createdBy),
+            Task.startDate, Task.dueDate, Task.createdAt, Task.updatedAt
+        ),
+        watermark=Task.updatedAt,
+        task_id="id",
+        partitioned=True
+    ),
+    "task_comments": Dataset(
+        schema=pa.schema([
+            ("id", pa.string()),
+            ("taskId", pa.string()),
+            ("projectId", pa.string()),
+            ("authorId", pa.string()),
+            ("content", pa.string()),
+            ("createdAt", pa.timestamp("us"))
+        ]),
+        query=select(
+            _as_text(TaskComment.id), _as_text(TaskComment.taskId), _as_text(Task.projectId),
+            _as_text(TaskComment.authorId), TaskComment.content, TaskComment.createdAt
+        ).join(Task, Task.id == TaskComment.taskId),
+        watermark=TaskComment.createdAt,
+        task_id="taskId",
+        partitioned=True
+    ),
+    "deleted_tasks": Dataset(
+        schema=pa.schema([
+            ("id", pa.string()),
+            ("deletedAt", pa.timestamp("us"))
+        ]),
+        query=select(_as_text(DeletedTask.id), DeletedTask.deletedAt),
+        watermark=DeletedTask.deletedAt,
+        task_id=None,
+        partitioned=False
+    )
+}
+
+
+def partition_of(created_at: datetime) -> str:
+    return f"{created_at.year:04d}-{created_at.month:02d}"
+
+
+def latest_rows(table: pa.Table) -> pa.Table:
+    """Keep the last row of every id; files are listed in run order, so later rows are newer"""
+    if table.num_rows == 0:
+        return table
+    last = table.append_column("_row", pa.array(np.arange(table.num_rows))).group_by("id").aggregate([("_row", "max")])
+    rows = last["_row_max"]
+    return table.take(pc.take(rows, pc.sort_indices(rows)))
+
+
+def _map_file(path: str) -> pa.Table:
+    # Record batches reference the mapped pages directly; the mapping lives as long as the table
+    return pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+
+class SnapshotStore:
+    """Partitioned Arrow IPC files of the exported datasets plus a manifest that lists them.
+
+    Files are written uncompressed, so a reader memory-maps them and gets
+    Arrow columns without decoding or copying. Each run appends one file to
+    every partition it touched; the manifest is replaced atomically after
+    the files are in place, so readers only ever see complete runs.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, relative: str) -> str:
+        return os.path.join(self.directory, relative)
+
+    def load_manifest(self) -> dict:
+        try:
+            with open(self._path(MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"run": 0, "datasets": {}, "obsolete": []}
+
+    def save_manifest(self, manifest: dict):
+        tmp = self._path(MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._path(MANIFEST))
+
+    def write_file(self, relative: str, table: pa.Table):
+        path = self._path(relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with pa.OSFile(path + ".tmp", "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                # An export spreads each fetched batch over many partitions; write large batches instead
+                writer.write_table(table.combine_chunks(), max_chunksize=settings.SNAPSHOT_FILE_BATCH_ROWS)
+        os.replace(path + ".tmp", path)
+
+    def read_partition(self, files: List[dict], schema: pa.Schema) -> pa.Table:
+        if not files:
+            return schema.empty_table()
+        table = pa.concat_tables([_map_file(self._path(file["path"])) for file in files])
+        # A single file is already one row per id: return the mapped columns untouched
+        return latest_rows(table) if len(files) > 1 else table
+
+    def read(self, name: str, since: Optional[date] = None, until: Optional[date] = None,
+             project_id: Optional[str] = None, columns: Optional[List[str]] = None) -> pa.Table:
+        """Current rows of a dataset, optionally created within [since, until] and in one project"""
+        dataset = DATASETS[name]
+        manifest = self.load_manifest()
+        partitions = manifest["datasets"].get(name, {}).get("partitions", {})
+        selected = [
+            files for partition, files in sorted(partitions.items())
+            if not dataset.partitioned
+            or (since is None or partition >= partition_of(since)) and (until is None or partition <= partition_of(until))
+        ]
+        tables = [self.read_partition(files, dataset.schema) for files in selected]
+        table = pa.concat_tables(tables) if tables else dataset.schema.empty_table()
+
+        conditions = []
+        if dataset.task_id is not None:
+            deleted = self.read_partition(
+                manifest["datasets"].get("deleted_tasks", {}).get("partitions", {}).get("", []),
+                DATASETS["deleted_tasks"].schema
+            )
+            if deleted.num_rows:
+                hit = pc.is_in(table[dataset.task_id], value_set=deleted["id"].combine_chunks())
+                if pc.any(hit).as_py():
+                    conditions.append(pc.invert(hit))
+        if since is not None:
+            conditions.append(pc.greater_equal(table["createdAt"], pa.scalar(datetime.combine(since, datetime.min.time()), pa.timestamp("us"))))
+        if until is not None:
+            conditions.append(pc.less(table["createdAt"], pa.scalar(datetime.combine(until + timedelta(days=1), datetime.min.time()), pa.timestamp("us"))))
+        if project_id is not None:
+            conditions.append(pc.equal(table["projectId"], project_id))
+        if conditions:
+            mask = conditions[0]
+            for condition in conditions[1:]:
+                mask = pc.and_(mask, condition)
+            # Only the selected rows are copied; without conditions the table stays mapped
+            table = table.filter(mask)
+        return table.select(columns) if columns else table
+
+    def summary(self) -> dict:
+        manifest = self.load_manifest()
+        return {
+            "run": manifest["run"],
+            "datasets": {
+                name: {
+                    "watermark": info["watermark"],
+                    "partitions": {
+                        partition or "all": {"files": len(files), "rows": sum(file["rows"] for file in files)}
+                        for partition, files in sorted(info["partitions"].items())
+                    }
+                }
+                for name, info in manifest["datasets"].items()
+            }
+        }
+
+
+class SnapshotJob:
+    """Periodically exports tasks, task_comments and deleted_tasks rows changed since the last run.
+
+    Every dataset keeps a watermark on its timestamp column, and a run
+    exports the rows between the watermark and SNAPSHOT_COMMIT_LAG_S ago.
+    The timestamps are set before commit, so the lag keeps a run from
+    passing rows whose transaction is still open. A changed row is exported
+    again and readers keep its last version. Partitions that collected many
+    files are compacted into one, dropping deleted tasks and their comments.
+    The files are on local disk, so the job runs on one instance.
+    """
+
+    def __init__(self, store: SnapshotStore):
+        self.store = store
+        self.task = None
+        self.runs = 0
+        self.failures = 0
+        self.exported = 0
+        self.compactions = 0
+        self.last_run_seconds = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(self.run_once)
+            except Exception as e:
+                # The manifest was not replaced, so the next run exports the same rows again
+                self.failures += 1
+                print(f"Snapshot failed: {e}")
+            await asyncio.sleep(settings.SNAPSHOT_INTERVAL_S)
+
+    def run_once(self) -> int:
+        started = time.perf_counter()
+        manifest = self.store.load_manifest()
+        # Files replaced by the previous compaction; readers had a whole interval to finish with them
+        for relative in manifest["obsolete"]:
+            try:
+                os.remove(self.store._path(relative))
+            except FileNotFoundError:
+                pass
+        manifest["obsolete"] = []
+        manifest["run"] += 1
+
+        exported = 0
+        # One snapshot for all datasets, so a deleted task and its last update are seen together
+        with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+            for name, dataset in DATASETS.items():
+                info = manifest["datasets"].setdefault(name, {"watermark": None, "partitions": {}})
+                exported += self._export(conn, name, dataset, info, manifest["run"])
+
+        for name, dataset in DATASETS.items():
+            self._compact(name, dataset, manifest)
+        self.store.save_manifest(manifest)
+
+        self.runs += 1
+        self.exported += exported
+        self.last_run_seconds = time.perf_counter() - started
+        return exported
+
+    def _export(self, conn, name: str, dataset: Dataset, info: dict, run: int) -> int:
+        until = datetime.utcnow() - timedelta(seconds=settings.SNAPSHOT_COMMIT_LAG_S)
+        query = dataset.query.where(dataset.watermark <= until)
+        if info["watermark"] is not None:
+            query = query.where(dataset.watermark > datetime.fromisoformat(info["watermark"]))
+        result = conn.execution_options(yield_per=settings.SNAPSHOT_BATCH_SIZE).execute(query)
+
+        created_at = dataset.schema.get_field_index("createdAt")
+        batches: Dict[str, List[pa.RecordBatch]] = {}
+        exported = 0
+        for rows in result.partitions():
+            grouped: Dict[str, list] = {}
+            for row in rows:
+                grouped.setdefault(partition_of(row[created_at]) if dataset.partitioned else "", []).append(row)
+            for partition, partition_rows in grouped.items():
+                batches.setdefault(partition, []).append(pa.RecordBatch.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(zip(*partition_rows), dataset.schema)],
+                    schema=dataset.schema
+                ))
+            exported += len(rows)
+
+        for partition, partition_batches in batches.items():
+            directory = f"{name}/createdMonth={partition}" if partition else name
+            relative = f"{directory}/part-{run:08d}.arrow"
+            table = pa.Table.from_batches(partition_batches, dataset.schema)
+            self.store.write_file(relative, table)
+            info["partitions"].setdefault(partition, []).append({"path": relative, "rows": table.num_rows})
+        info["watermark"] = until.isoformat()
+        return exported
+
+    def _compact(self, name: str, dataset: Dataset, manifest: dict):
+        partitions = manifest["datasets"][name]["partitions"]
+        deleted = None
+        for partition, files in partitions.items():
+            if len(files) < settings.SNAPSHOT_COMPACT_FILES:
+                continue
+            table = self.store.read_partition(files, dataset.schema)
+            if dataset.task_id is not None:
+                if deleted is None:
+                    deleted = self.store.read_partition(
+                        manifest["datasets"]["deleted_tasks"]["partitions"].get("", []),
+                        DATASETS["deleted_tasks"].schema
+                    )["id"].combine_chunks()
+                table = table.filter(pc.invert(pc.is_in(table[dataset.task_id], value_set=deleted)))
+
+            relative = files[-1]["path"].replace(".arrow", "-compacted.arrow")
+            self.store.write_file(relative, table)
+            manifest["obsolete"].extend(file["path"] for file in files)
+            partitions[partition] = [{"path": relative, "rows": table.num_rows}]
+            self.compactions += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.SNAPSHOT_ENABLED,
+            "runs": self.runs,
+            "failures": self.failures,
+            "exported_rows": self.exported,
+            "compactions": self.compactions,
+            "last_run_seconds": self.last_run_seconds
+        }
+
+
+def stream_arrow(table: pa.Table) -> Iterator[bytes]:
+    """Arrow IPC stream of a table, one chunk per record batch"""
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, table.schema)
+    for batch in table.to_batches(max_chunksize=settings.SNAPSHOT_BATCH_SIZE):
+        writer.write_batch(batch)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+
+snapshot_store = SnapshotStore(settings.SNAPSHOT_DIR)
+snapshot_job = SnapshotJob(snapshot_store)
@@ -0,0 +1,86 @@
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, List
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from config import settings
+from database import engine
+from models import Task, TaskCounter
+from schemas import TaskSummary
+
+
+def counter_key(task: Task) -> tuple:
+    return task.projectId, task.status, task.priority
+
+
+async def apply_counter_deltas(db, deltas: Counter):
+    """Upsert task_counters in the caller's transaction; rows are sorted so concurrent writers lock them in the same order"""
+    rows = [
+        {"projectId": project_id, "status": task_status, "priority": priority, "count": delta}
+        for (project_id, task_status, priority), delta in sorted(deltas.items(), key=lambda item: tuple(map(str, item[0])))
+        if delta
+    ]
+    if not rows:
+        return
+    stmt = pg_insert(TaskCounter).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[TaskCounter.projectId, TaskCounter.status, TaskCounter.priority],
+        set_={"count": TaskCounter.count + stmt.excluded.count}
+    ))
+
+
+def ensure_task_counters():
+    """Backfill task_counters from tasks the first time the rollup is deployed"""
+    with engine.begin() as conn:
+        if conn.scalar(select(TaskCounter.projectId).limit(1)) is not None:
+            return
+        # Writes to tasks wait until the backfill commits, so no change is missed or counted twice.
+        # Locks are taken in the same order as the write endpoints: tasks, then task_counters
+        conn.execute(text("LOCK TABLE tasks IN SHARE MODE"))
+        conn.execute(text("LOCK TABLE task_counters IN EXCLUSIVE MODE"))
+        if conn.scalar(select(TaskCounter.projectId).limit(1)) is not None:
+            return
+        conn.execute(pg_insert(TaskCounter).from_select(
+            ["projectId", "status", "priority", "count"],
+            select(Task.projectId, Task.status, Task.priority, func.count())
+            .group_by(Task.projectId, Task.status, Task.priority)
+        ))
+
+
+async def load_summaries(db, project_ids: Iterable[uuid.UUID]) -> List[TaskSummary]:
+    """Counts by status and priority plus overdue counts, in the order of project_ids"""
+    project_ids = list(dict.fromkeys(project_ids))
+    summaries = {
+        project_id: TaskSummary(projectId=str(project_id), total=0, byStatus={}, byPriority={}, overdue=0)
+        for project_id in project_ids
+    }
+
+    if settings.TASKS_SUMMARY_USE_ROLLUP:
+        counts = select(TaskCounter.projectId, TaskCounter.status, TaskCounter.priority, TaskCounter.count).where(
+            TaskCounter.projectId.in_(project_ids),
+            TaskCounter.count > 0
+        )
+    else:
+        counts = select(Task.projectId, Task.status, Task.priority, func.count()).where(
+            Task.projectId.in_(project_ids)
+        ).group_by(Task.projectId, Task.status, Task.priority)
+
+    for project_id, task_status, priority, count in (await db.execute(counts)).all():
+        summary = summaries[project_id]
+        summary.total += count
+        summary.byStatus[task_status] = summary.byStatus.get(task_status, 0) + count
+        summary.byPriority[priority] = summary.byPriority.get(priority, 0) + count
+
+    # Overdue depends on the current time, so it is always counted from tasks
+    overdue = select(Task.projectId, func.count()).where(
+        Task.projectId.in_(project_ids),
+        Task.dueDate < datetime.utcnow(),
+        Task.status.not_in(settings.TASKS_DONE_STATUSES)
+    ).group_by(Task.projectId)
+    for project_id, count in (await db.execute(overdue)).all():
+        summaries[project_id].overdue = count
+
+    return list(summaries.values())